@@ -4,59 +4,171 @@ Flask API for Cyberpunk Tracker
 Serves character data from SQLite database to frontend
 """
 
-from flask import Flask, jsonify, request, send_from_directory
-from flask_cors import CORS
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, redirect, request, send_file
+from werkzeug.local import LocalProxy
+from typing import Optional
 import sys
 import os
+import time
 
-# Add database directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'database'))
-from db_helper import DatabaseHelper
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(API_DIR)
+DATABASE_DIR = os.path.join(PROJECT_ROOT, 'database')
+DEFAULT_DB_PATH = os.path.join(DATABASE_DIR, 'cyberpunk_tracker.db')
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend requests
-
-# Initialize database helper
-db_path = os.path.join(os.path.dirname(__file__), '..', 'database', 'cyberpunk_tracker.db')
-db = DatabaseHelper(db_path)
+# Content-hashed tiles never change, so clients may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
 
 # For demo, we'll use character_id = 1
 # In production, you'd have user authentication and select the appropriate character
 DEFAULT_CHARACTER_ID = 1
 
+api = Blueprint('api', __name__)
+
+# Services are created by create_app() and looked up per app, so that
+# several apps (e.g. tests against different databases) can coexist
+db = LocalProxy(lambda: current_app.extensions['cyberpunk']['db'])
+map_tiles = LocalProxy(lambda: current_app.extensions['cyberpunk']['map_tiles'])
+static_assets = LocalProxy(lambda: current_app.extensions['cyberpunk']['static_assets'])
+metrics = LocalProxy(lambda: current_app.extensions['cyberpunk']['metrics'])
+
+
+def create_app(db_path: Optional[str] = None) -> Flask:
+    """
+    Create and configure the API app
+    
+    Heavy modules are imported here rather than at import time. The database
+    schema is verified by comparing a stored fingerprint with schema.sql, so
+    an up-to-date database costs a single row lookup; a missing or outdated
+    database is (re)initialized before the first request.
+    
+    Args:
+        db_path: Path to the SQLite database (defaults to CYBERPUNK_DB_PATH,
+            then database/cyberpunk_tracker.db)
+    
+    Returns:
+        Configured Flask app
+    
+    Raises:
+        RuntimeError: If the database schema can't be brought up to date, or
+            CYBERPUNK_SHARDS doesn't match how the characters are stored
+    """
+    if DATABASE_DIR not in sys.path:
+        sys.path.append(DATABASE_DIR)
+    from flask_cors import CORS
+    from db_helper import DatabaseHelper
+    from init_db import ensure_schema
+    from metrics import registry
+    from sharding import check_layout
+    from map_tiles import MapTileService
+    from static_assets import StaticAssetServer
+    
+    db_path = db_path or os.environ.get('CYBERPUNK_DB_PATH', DEFAULT_DB_PATH)
+    if not ensure_schema(db_path):
+        raise RuntimeError(f"Database {db_path} could not be brought up to the current schema")
+    
+    # Queries slower than this many milliseconds are logged with their query plan
+    slow_query_ms = float(os.environ.get('CYBERPUNK_SLOW_QUERY_MS', '100'))
+    # Spread characters over several files by user (CYBERPUNK_SHARDS > 1)
+    shard_count = int(os.environ.get('CYBERPUNK_SHARDS', '0'))
+    check_layout(db_path, shard_count)
+    # Group writes arriving within this many milliseconds into one commit (unset: commit each write)
+    write_queue_ms = os.environ.get('CYBERPUNK_WRITE_QUEUE_MS')
+    database = DatabaseHelper(
+        db_path, slow_query_threshold=slow_query_ms / 1000, shard_count=shard_count,
+        write_queue_window=float(write_queue_ms) / 1000 if write_queue_ms else None
+    )
+    database.optimize()
+    
+    # Flask's own static folder is replaced by StaticAssetServer
+    app = Flask(__name__, static_folder=None)
+    CORS(app)  # Enable CORS for frontend requests
+    
+    app.extensions['cyberpunk'] = {
+        'db': database,
+        'metrics': registry,
+        # Map tiles are cached next to the API, named by content hash
+        'map_tiles': MapTileService(database, os.path.join(API_DIR, 'tile_cache')),
+        # Frontend files are indexed and precompressed once at startup
+        'static_assets': StaticAssetServer(PROJECT_ROOT, gzip_dir=os.path.join(API_DIR, 'static_cache'),
+                                           metrics=registry),
+        'request_duration': registry.histogram(
+            'cyberpunk_http_request_duration_seconds', 'Time spent handling HTTP requests'),
+        'request_errors': registry.counter(
+            'cyberpunk_http_errors_total', 'HTTP responses with a 5xx status'),
+    }
+    
+    # Scheduled backups, archival and orphan sweeps. Every worker process
+    # calls create_app(), so they only start here when asked to; with
+    # several workers, run `python3 database/jobs.py` once instead
+    if os.environ.get('CYBERPUNK_RUN_JOBS') == '1':
+        from jobs import scheduled_jobs
+        jobs = scheduled_jobs(database)
+        for job in jobs:
+            job.start()
+        app.extensions['cyberpunk']['jobs'] = jobs
+    
+    app.register_blueprint(api)
+    return app
+
+
+@api.before_app_request
+def start_request_timer():
+    """Remember when the request started"""
+    g.request_start = time.perf_counter()
+
 
-@app.route('/api/character/<int:character_id>', methods=['GET'])
+@api.after_app_request
+def record_request_metrics(response):
+    """Record latency per route (the URL rule, not the raw path, to keep series bounded)"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if route == '/<path:filename>':
+            route = 'static'
+        services = current_app.extensions['cyberpunk']
+        services['request_duration'].observe(time.perf_counter() - start, route=route,
+                                             method=request.method, status=response.status_code)
+        if response.status_code >= 500:
+            services['request_errors'].inc(route=route, method=request.method)
+    return response
+
+
+@api.route('/api/character/<int:character_id>', methods=['GET'])
 def get_character(character_id):
     """Get complete character information"""
     try:
+        # Character rows live on the character's shard (the main database when not sharded)
+        char_db = db.for_character(character_id)
+        
         # Get character basic info
-        character = db.get_character(character_id)
+        character = char_db.get_character(character_id)
         if not character:
             return jsonify({'error': 'Character not found'}), 404
         
         # Get related data
-        background = db.execute_query(
+        background = char_db.execute_query(
             "SELECT * FROM background WHERE character_id = ?", 
             (character_id,)
         )
         background = background[0] if background else {}
         
-        contacts = db.get_character_contacts(character_id)
+        contacts = char_db.get_character_contacts(character_id)
         
         # Get critical injuries
-        injuries = db.execute_query(
+        injuries = char_db.execute_query(
             "SELECT * FROM critical_injuries WHERE character_id = ? AND healed = 0",
             (character_id,)
         )
         
         # Get addictions
-        addictions = db.execute_query(
+        addictions = char_db.execute_query(
             "SELECT * FROM addictions WHERE character_id = ?",
             (character_id,)
         )
         
         # Get reputation
-        reputation = db.execute_query(
+        reputation = char_db.execute_query(
             "SELECT * FROM reputation WHERE character_id = ?",
             (character_id,)
         )
@@ -86,142 +198,160 @@ def get_character(character_id):
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/character/<int:character_id>', methods=['PUT'])
+@api.route('/api/character/<int:character_id>/history', methods=['GET'])
+def get_character_history(character_id):
+    """Get a character's healed critical injuries and inactive status effects"""
+    from archive import Archiver
+    try:
+        if not db.get_character(character_id):
+            return jsonify({'error': 'Character not found'}), 404
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        return jsonify(Archiver(db).history(character_id, limit))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/character/<int:character_id>', methods=['PUT'])
 def update_character(character_id):
     """Update character information"""
     try:
-        data = request.json
+        # Character rows live on the character's shard (the main database when not sharded)
+        char_db = db.for_character(character_id)
         
-        # Update character basic info
-        if 'character' in data:
-            char_data = data['character']
-            db.update_character(character_id, **char_data)
+        data = request.json
         
-        # Update background
-        if 'background' in data:
-            bg_data = data['background']
-            # Check if background exists
-            existing = db.execute_query(
-                "SELECT background_id FROM background WHERE character_id = ?",
-                (character_id,)
-            )
-            if existing:
-                # Update existing background
-                set_clause = ', '.join([f"{key} = ?" for key in bg_data.keys()])
-                values = list(bg_data.values()) + [character_id]
-                db.execute_update(
-                    f"UPDATE background SET {set_clause} WHERE character_id = ?",
-                    tuple(values)
-                )
-            else:
-                # Create new background
-                fields = ['character_id'] + list(bg_data.keys())
-                values = [character_id] + list(bg_data.values())
-                placeholders = ', '.join(['?'] * len(values))
-                db.execute_update(
-                    f"INSERT INTO background ({', '.join(fields)}) VALUES ({placeholders})",
-                    tuple(values)
+        # All writes of a request are committed together, in one transaction
+        with char_db.batch():
+            # Update character basic info
+            if 'character' in data:
+                char_data = data['character']
+                char_db.update_character(character_id, **char_data)
+            
+            # Update background
+            if 'background' in data:
+                bg_data = data['background']
+                # Check if background exists
+                existing = char_db.execute_query(
+                    "SELECT background_id FROM background WHERE character_id = ?",
+                    (character_id,)
                 )
-        
-        # Update contacts (delete and recreate for simplicity)
-        if 'contacts' in data:
-            # Delete existing contacts
-            db.execute_update("DELETE FROM contacts WHERE character_id = ?", (character_id,))
+                if existing:
+                    # Update existing background
+                    set_clause = ', '.join([f"{key} = ?" for key in bg_data.keys()])
+                    values = list(bg_data.values()) + [character_id]
+                    char_db.execute_update(
+                        f"UPDATE background SET {set_clause} WHERE character_id = ?",
+                        tuple(values)
+                    )
+                else:
+                    # Create new background
+                    fields = ['character_id'] + list(bg_data.keys())
+                    values = [character_id] + list(bg_data.values())
+                    placeholders = ', '.join(['?'] * len(values))
+                    char_db.execute_update(
+                        f"INSERT INTO background ({', '.join(fields)}) VALUES ({placeholders})",
+                        tuple(values)
+                    )
             
-            # Add new contacts
-            contacts_data = data['contacts']
+            # Update contacts (delete and recreate for simplicity)
+            if 'contacts' in data:
+                # Delete existing contacts
+                char_db.execute_update("DELETE FROM contacts WHERE character_id = ?", (character_id,))
+                
+                # Add new contacts
+                contacts_data = data['contacts']
+                
+                # Add friends
+                for i, friend in enumerate(contacts_data.get('friends', []), 1):
+                    if friend.get('name'):
+                        char_db.add_contact(
+                            character_id, 
+                            'friend', 
+                            friend['name'],
+                            contact_number=i,
+                            notes=friend.get('notes', '')
+                        )
+                
+                # Add loves
+                for i, love in enumerate(contacts_data.get('loves', []), 1):
+                    if love.get('name'):
+                        char_db.add_contact(
+                            character_id,
+                            'love',
+                            love['name'],
+                            contact_number=i,
+                            notes=love.get('notes', '')
+                        )
+                
+                # Add enemies
+                for i, enemy in enumerate(contacts_data.get('enemies', []), 1):
+                    if enemy.get('name'):
+                        char_db.add_contact(
+                            character_id,
+                            'enemy',
+                            enemy['name'],
+                            contact_number=i,
+                            who_wronged=enemy.get('who_wronged', ''),
+                            what_caused=enemy.get('what_caused', ''),
+                            what_throw_down=enemy.get('what_throw_down', ''),
+                            what_happened=enemy.get('what_happened', ''),
+                            notes=enemy.get('notes', '')
+                        )
             
-            # Add friends
-            for i, friend in enumerate(contacts_data.get('friends', []), 1):
-                if friend.get('name'):
-                    db.add_contact(
-                        character_id, 
-                        'friend', 
-                        friend['name'],
-                        contact_number=i,
-                        notes=friend.get('notes', '')
+            # Update reputation
+            if 'reputation' in data:
+                rep_data = data['reputation']
+                existing = char_db.execute_query(
+                    "SELECT reputation_id FROM reputation WHERE character_id = ?",
+                    (character_id,)
+                )
+                if existing:
+                    set_clause = ', '.join([f"{key} = ?" for key in rep_data.keys()])
+                    values = list(rep_data.values()) + [character_id]
+                    char_db.execute_update(
+                        f"UPDATE reputation SET {set_clause} WHERE character_id = ?",
+                        tuple(values)
                     )
-            
-            # Add loves
-            for i, love in enumerate(contacts_data.get('loves', []), 1):
-                if love.get('name'):
-                    db.add_contact(
-                        character_id,
-                        'love',
-                        love['name'],
-                        contact_number=i,
-                        notes=love.get('notes', '')
+                else:
+                    fields = ['character_id'] + list(rep_data.keys())
+                    values = [character_id] + list(rep_data.values())
+                    placeholders = ', '.join(['?'] * len(values))
+                    char_db.execute_update(
+                        f"INSERT INTO reputation ({', '.join(fields)}) VALUES ({placeholders})",
+                        tuple(values)
                     )
             
-            # Add enemies
-            for i, enemy in enumerate(contacts_data.get('enemies', []), 1):
-                if enemy.get('name'):
-                    db.add_contact(
-                        character_id,
-                        'enemy',
-                        enemy['name'],
-                        contact_number=i,
-                        who_wronged=enemy.get('who_wronged', ''),
-                        what_caused=enemy.get('what_caused', ''),
-                        what_throw_down=enemy.get('what_throw_down', ''),
-                        what_happened=enemy.get('what_happened', ''),
-                        notes=enemy.get('notes', '')
-                    )
-        
-        # Update reputation
-        if 'reputation' in data:
-            rep_data = data['reputation']
-            existing = db.execute_query(
-                "SELECT reputation_id FROM reputation WHERE character_id = ?",
-                (character_id,)
-            )
-            if existing:
-                set_clause = ', '.join([f"{key} = ?" for key in rep_data.keys()])
-                values = list(rep_data.values()) + [character_id]
-                db.execute_update(
-                    f"UPDATE reputation SET {set_clause} WHERE character_id = ?",
-                    tuple(values)
+            # Update critical injuries (delete and recreate)
+            if 'critical_injuries' in data:
+                char_db.execute_update(
+                    "DELETE FROM critical_injuries WHERE character_id = ? AND healed = 0",
+                    (character_id,)
                 )
-            else:
-                fields = ['character_id'] + list(rep_data.keys())
-                values = [character_id] + list(rep_data.values())
-                placeholders = ', '.join(['?'] * len(values))
-                db.execute_update(
-                    f"INSERT INTO reputation ({', '.join(fields)}) VALUES ({placeholders})",
-                    tuple(values)
+                injuries_text = data['critical_injuries']
+                if injuries_text:
+                    # Split by lines and create separate entries
+                    for injury_line in injuries_text.split('\n'):
+                        if injury_line.strip():
+                            char_db.execute_update(
+                                "INSERT INTO critical_injuries (character_id, injury_name, description) VALUES (?, ?, ?)",
+                                (character_id, injury_line[:50], injury_line)
+                            )
+            
+            # Update addictions (delete and recreate)
+            if 'addictions' in data:
+                char_db.execute_update(
+                    "DELETE FROM addictions WHERE character_id = ?",
+                    (character_id,)
                 )
-        
-        # Update critical injuries (delete and recreate)
-        if 'critical_injuries' in data:
-            db.execute_update(
-                "DELETE FROM critical_injuries WHERE character_id = ? AND healed = 0",
-                (character_id,)
-            )
-            injuries_text = data['critical_injuries']
-            if injuries_text:
-                # Split by lines and create separate entries
-                for injury_line in injuries_text.split('\n'):
-                    if injury_line.strip():
-                        db.execute_update(
-                            "INSERT INTO critical_injuries (character_id, injury_name, description) VALUES (?, ?, ?)",
-                            (character_id, injury_line[:50], injury_line)
-                        )
-        
-        # Update addictions (delete and recreate)
-        if 'addictions' in data:
-            db.execute_update(
-                "DELETE FROM addictions WHERE character_id = ?",
-                (character_id,)
-            )
-            addictions_text = data['addictions']
-            if addictions_text:
-                # Split by lines and create separate entries
-                for addiction_line in addictions_text.split('\n'):
-                    if addiction_line.strip():
-                        db.execute_update(
-                            "INSERT INTO addictions (character_id, substance, severity) VALUES (?, ?, ?)",
-                            (character_id, addiction_line[:50], 'mild')
-                        )
+                addictions_text = data['addictions']
+                if addictions_text:
+                    # Split by lines and create separate entries
+                    for addiction_line in addictions_text.split('\n'):
+                        if addiction_line.strip():
+                            char_db.execute_update(
+                                "INSERT INTO addictions (character_id, substance, severity) VALUES (?, ?, ?)",
+                                (character_id, addiction_line[:50], 'mild')
+                            )
         
         return jsonify({'success': True, 'message': 'Character updated successfully'})
     
@@ -229,18 +359,173 @@ def update_character(character_id):
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/characters', methods=['GET'])
+@api.route('/api/characters', methods=['GET'])
 def list_characters():
-    """List all characters (for future character selection)"""
+    """List all characters, optionally filtered by ?search= on handle or role"""
     try:
-        characters = db.execute_query("SELECT character_id, handle, role FROM characters ORDER BY handle")
+        search = request.args.get('search', '').strip()
+        if search:
+            pattern = f"%{search}%"
+            characters = db.fan_out(
+                "SELECT character_id, handle, role FROM characters WHERE handle LIKE ? OR role LIKE ? ORDER BY handle",
+                (pattern, pattern),
+                sort_key=lambda c: c['handle']
+            )
+        else:
+            characters = db.fan_out(
+                "SELECT character_id, handle, role FROM characters ORDER BY handle",
+                sort_key=lambda c: c['handle']
+            )
         return jsonify(characters)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@api.route('/api/maps/<int:map_id>/tiles', methods=['GET'])
+def get_map_tiles(map_id):
+    """Get the tile manifest for a map (builds the tile pyramid on first request)"""
+    try:
+        manifest = map_tiles.get_manifest(map_id)
+        response = jsonify({
+            'map_id': map_id,
+            'width': manifest['width'],
+            'height': manifest['height'],
+            'tile_size': manifest['tile_size'],
+            'min_zoom': manifest['min_zoom'],
+            'max_zoom': manifest['max_zoom'],
+            'tile_url': f"/api/maps/{map_id}/tiles/{{digest}}.png",
+            'tiles': manifest['tiles']
+        })
+        # Manifest changes when the map changes, so always revalidate
+        response.cache_control.no_cache = True
+        response.set_etag(manifest['fingerprint'])
+        return response.make_conditional(request)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except FileNotFoundError:
+        return jsonify({'error': 'Map image not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/maps/<int:map_id>/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_map_tile(map_id, z, x, y):
+    """Get a single tile by zoom level and position"""
+    try:
+        digest = map_tiles.get_tile_digest(map_id, z, x, y)
+        if not digest:
+            return jsonify({'error': 'Tile not found'}), 404
+        # Short max-age: this URL points at a different tile once the map changes
+        return send_file(map_tiles.tile_path(map_id, digest), mimetype='image/png',
+                         conditional=True, etag=digest, max_age=60)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except FileNotFoundError:
+        return jsonify({'error': 'Map image not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/maps/<int:map_id>/tiles/<digest>.png', methods=['GET'])
+def get_map_tile_by_digest(map_id, digest):
+    """Get a content-hashed tile (safe to cache forever)"""
+    if not digest.isalnum():
+        return jsonify({'error': 'Tile not found'}), 404
+    path = map_tiles.tile_path(map_id, digest)
+    if not os.path.isfile(path):
+        return jsonify({'error': 'Tile not found'}), 404
+    response = send_file(path, mimetype='image/png', conditional=True,
+                         etag=digest, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@api.route('/api/combat/matchup/<int:attacker_id>/<int:target_id>', methods=['GET'])
+def get_combat_matchup(attacker_id, target_id):
+    """Simulate the attacker's equipped weapons against the target's armor and HP"""
+    from combat import equipped_matchup
+    try:
+        hits = min(max(request.args.get('hits', 10, type=int), 1), 50)
+        matchup = equipped_matchup(db, attacker_id, target_id, hits=hits)
+        if matchup is None:
+            return jsonify({'error': 'Character not found'}), 404
+        return jsonify(matchup)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/combat/round', methods=['POST'])
+def apply_combat_round():
+    """Apply a combat round's HP, ammo, status effect and injury changes in one transaction"""
+    from combat_round import apply_round
+    try:
+        data = request.get_json(silent=True) or {}
+        characters = apply_round(db, data.get('mutations'))
+        return jsonify({'success': True, 'characters': characters})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/users/<int:user_id>', methods=['DELETE'])
+def delete_user(user_id):
+    """Delete a user and all their characters in one transaction, reporting how long it took"""
+    try:
+        start = time.perf_counter()
+        deleted = db.delete_user(user_id)
+        if deleted is None:
+            return jsonify({'error': 'User not found'}), 404
+        return jsonify({
+            'success': True,
+            'user_id': user_id,
+            'characters_deleted': deleted['characters_deleted'],
+            'rows_deleted': deleted['rows_deleted'],
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/', methods=['GET'])
+def index():
+    """Redirect to the frontend entry point"""
+    return redirect('/html/index.html')
+
+
+@api.route('/<path:filename>', methods=['GET'])
+def get_static_asset(filename):
+    """Serve frontend files (html, css, js, images)"""
+    response = static_assets.serve(filename)
+    if response is None:
+        return jsonify({'error': 'Not found'}), 404
+    return response
+
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Expose metrics in Prometheus text format"""
+    from metrics import PROMETHEUS_CONTENT_TYPE
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@api.route('/api/debug/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """List the slowest recorded queries with their query plans"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 1000)
+    offenders = db.slow_queries.worst_offenders(limit)
+    return jsonify({
+        'threshold_ms': db.slow_queries.threshold * 1000,
+        'full_scan_statements': sum(1 for o in offenders if o['full_scans']),
+        'offenders': offenders
+    })
+
+
 # Health check endpoint
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Check if API is running"""
     return jsonify({'status': 'ok', 'message': 'Cyberpunk Tracker API is running'})
@@ -248,13 +533,23 @@ def health_check():
 
 if __name__ == '__main__':
     print("Starting Cyberpunk Tracker API...")
-    print(f"Database path: {db_path}")
+    app = create_app()
+    print(f"Database path: {app.extensions['cyberpunk']['db'].db_path}")
     print("API will be available at: http://localhost:5000")
+    print("Frontend will be available at: http://localhost:5000/html/index.html")
     print("\nEndpoints:")
     print("  GET  /api/health")
+    print("  GET  /api/metrics")
+    print("  GET  /api/debug/slow-queries")
     print("  GET  /api/characters")
     print("  GET  /api/character/<id>")
     print("  PUT  /api/character/<id>")
+    print("  GET  /api/character/<id>/history")
+    print("  GET  /api/maps/<id>/tiles")
+    print("  GET  /api/maps/<id>/tiles/<z>/<x>/<y>")
+    print("  GET  /api/combat/matchup/<attacker_id>/<target_id>")
+    print("  POST /api/combat/round")
+    print("  DELETE /api/users/<id>")
     print("\nPress Ctrl+C to stop the server")
     
     app.run(debug=False, host='0.0.0.0', port=5000, use_reloader=False)
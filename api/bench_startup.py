@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Cyberpunk Tracker API
+Measures import time and create_app() time in fresh interpreter processes
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter, so module caches start cold like on a new instance
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app(sys.argv[1])
+t2 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'create_app_ms': (t2 - t1) * 1000}))
+"""
+
+
+def run_probe(db_path):
+    """Start one interpreter and return its timings"""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, db_path],
+        cwd=API_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark_startup(runs=10):
+    """
+    Benchmark API startup
+
+    The first run starts from a missing database (schema is created); the
+    remaining runs find an up-to-date database and only verify the fingerprint.
+
+    Args:
+        runs: Number of warm runs
+
+    Returns:
+        Dictionary with cold and median warm timings in milliseconds
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        cold = run_probe(db_path)
+        warm = [run_probe(db_path) for _ in range(runs)]
+
+    return {
+        'cold_import_ms': cold['import_ms'],
+        'cold_create_app_ms': cold['create_app_ms'],
+        'warm_import_ms': statistics.median(r['import_ms'] for r in warm),
+        'warm_create_app_ms': statistics.median(r['create_app_ms'] for r in warm),
+    }
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    print("Cyberpunk Tracker - Startup Benchmark")
+    print("=" * 50)
+    results = benchmark_startup(runs)
+    print(f"First start (creates schema):")
+    print(f"  import app:   {results['cold_import_ms']:.1f} ms")
+    print(f"  create_app(): {results['cold_create_app_ms']:.1f} ms")
+    print(f"\nLater starts (median of {runs}):")
+    print(f"  import app:   {results['warm_import_ms']:.1f} ms")
+    print(f"  create_app(): {results['warm_create_app_ms']:.1f} ms")
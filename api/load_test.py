@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Load test for the Cyberpunk Tracker API
+Starts the API on a generated database and drives it with many concurrent clients
+"""
+
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_DIR = os.path.join(os.path.dirname(API_DIR), 'database')
+RESULTS_DIR = os.path.join(API_DIR, 'load_results')
+
+# Serving modes: how the server is started and which environment it gets
+MODES = {
+    'dev': ('werkzeug', {}),
+    'write-queue': ('werkzeug', {'CYBERPUNK_WRITE_QUEUE_MS': '2'}),
+    'sharded': ('werkzeug', {'CYBERPUNK_SHARDS': '4'}),
+    'sharded-write-queue': ('werkzeug', {'CYBERPUNK_SHARDS': '4', 'CYBERPUNK_WRITE_QUEUE_MS': '2'}),
+    'gunicorn': ('gunicorn', {}),
+    'gunicorn-write-queue': ('gunicorn', {'CYBERPUNK_WRITE_QUEUE_MS': '2'}),
+}
+
+# Share of each request type, e.g. "get=70,put=20,list=10"
+DEFAULT_MIX = 'get=70,put=15,list=10,round=5'
+
+DEV_SERVER = """
+import sys, app
+app.create_app().run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)
+"""
+
+
+# ==================== Test Database ====================
+
+def generate_database(db_path: str, users: int = 50, characters_per_user: int = 4, seed: int = 1) -> int:
+    """
+    Create a database with users and fully filled-in characters
+
+    Args:
+        db_path: File to create (overwritten)
+        users: Number of users
+        characters_per_user: Characters per user
+        seed: Random seed, so every run gets the same data
+
+    Returns:
+        Number of characters created
+    """
+    if DATABASE_DIR not in sys.path:
+        sys.path.append(DATABASE_DIR)
+    from db_helper import DatabaseHelper
+    from init_db import init_database
+    from metrics import MetricsRegistry
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    init_database(db_path, verbose=False)
+    db = DatabaseHelper(db_path, metrics=MetricsRegistry(), slow_query_threshold=None)
+    rng = random.Random(seed)
+    roles = ['Solo', 'Netrunner', 'Techie', 'Fixer', 'Nomad', 'Medtech', 'Rockerboy']
+
+    count = 0
+    for u in range(users):
+        user_id = db.create_user(f'load_user_{u}', 'x')
+        for c in range(characters_per_user):
+            max_hp = rng.randint(30, 55)
+            character_id = db.create_character(
+                user_id, f'Runner {u}-{c}', role=rng.choice(roles), rank=rng.randint(1, 10),
+                hp=max_hp, max_hp=max_hp, humanity=50, max_humanity=50, notes='Generated for load testing'
+            )
+            db.set_character_stats(character_id, reflexes=rng.randint(2, 8), body=rng.randint(2, 8))
+            for i in range(1, 4):
+                db.add_contact(character_id, 'friend', f'Contact {i}', contact_number=i)
+            db.execute_update(
+                "INSERT INTO ammo (character_id, ammo_type, quantity) VALUES (?, 'Standard 9mm', ?)",
+                (character_id, 10 ** 6)
+            )
+            count += 1
+    return count
+
+
+def _targets(db_path: str) -> List[Tuple[int, int]]:
+    """(character_id, ammo_id) pairs the clients pick from"""
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT character_id, MIN(ammo_id) FROM ammo GROUP BY character_id").fetchall()
+    finally:
+        conn.close()
+
+
+# ==================== Server ====================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode: str, db_path: str, port: int, workers: int = 4) -> subprocess.Popen:
+    """
+    Start the API in a separate process and wait until it answers
+
+    Args:
+        mode: Key of MODES
+        db_path: Database the server uses
+        port: Port to listen on (127.0.0.1)
+        workers: Worker processes for gunicorn
+
+    Returns:
+        The server process
+    """
+    server, mode_env = MODES[mode]
+    env = dict(os.environ, CYBERPUNK_DB_PATH=db_path, **mode_env)
+    if server == 'gunicorn':
+        if shutil.which('gunicorn') is None:
+            raise RuntimeError("gunicorn is not installed (pip3 install gunicorn)")
+        command = ['gunicorn', '-w', str(workers), '--threads', '8', '-b', f'127.0.0.1:{port}',
+                   '--log-level', 'warning', 'app:create_app()']
+    else:
+        command = [sys.executable, '-c', DEV_SERVER, str(port)]
+
+    process = subprocess.Popen(command, cwd=API_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Server did not start within 30 seconds")
+
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# ==================== Load ====================
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse "get=70,put=20" into request type weights"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('get', 'put', 'list', 'round'):
+            raise ValueError(f"Unknown request type {name!r} (use get, put, list, round)")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def _request(kind: str, target: Tuple[int, int], rng: random.Random) -> Tuple[str, str, Optional[bytes]]:
+    """Method, path and body for one request"""
+    character_id, ammo_id = target
+    if kind == 'get':
+        return 'GET', f'/api/character/{character_id}', None
+    if kind == 'list':
+        return 'GET', '/api/characters', None
+    if kind == 'put':
+        body = {
+            'character': {'hp': rng.randint(1, 30), 'notes': f'Updated at {time.time():.3f}'},
+            'reputation': {'reputation_score': rng.randint(0, 10), 'reputation_event': 'Load test'},
+            'critical_injuries': 'Cracked Ribs\nBroken Arm' if rng.random() < 0.5 else '',
+        }
+        return 'PUT', f'/api/character/{character_id}', json.dumps(body).encode()
+    body = {'mutations': [
+        {'type': 'hp', 'character_id': character_id, 'delta': rng.choice([-3, -1, 2])},
+        {'type': 'ammo', 'character_id': character_id, 'ammo_id': ammo_id, 'delta': -1},
+    ]}
+    return 'POST', '/api/combat/round', json.dumps(body).encode()
+
+
+def run_load(port: int, targets: List[Tuple[int, int]], clients: int = 16, duration: float = 10.0,
+             mix: str = DEFAULT_MIX, seed: int = 0) -> List[Tuple[str, float, int, str]]:
+    """
+    Drive the server from many concurrent clients
+
+    Each client is a thread with its own keep-alive connection that sends
+    requests back to back, so the offered load is `clients` requests in
+    flight at all times.
+
+    Args:
+        port: Server port on 127.0.0.1
+        targets: (character_id, ammo_id) pairs to pick from
+        clients: Number of concurrent clients
+        duration: Seconds to run
+        mix: Request type weights, e.g. "get=70,put=20,list=10"
+        seed: Random seed
+
+    Returns:
+        One (type, latency in seconds, status, error) tuple per request;
+        status is 0 when the connection failed
+    """
+    weights = parse_mix(mix)
+    kinds, kind_weights = list(weights), list(weights.values())
+    samples: List[List[Tuple[str, float, int, str]]] = [[] for _ in range(clients)]
+    start_gate = threading.Barrier(clients + 1)
+    deadline = [0.0]
+
+    def client(n):
+        rng = random.Random(seed * 1000 + n)
+        out = samples[n]
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        start_gate.wait()
+        while time.perf_counter() < deadline[0]:
+            kind = rng.choices(kinds, kind_weights)[0]
+            method, path, body = _request(kind, rng.choice(targets), rng)
+            headers = {'Content-Type': 'application/json'} if body else {}
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                payload = response.read()
+                elapsed = time.perf_counter() - start
+                error = ''
+                if response.status >= 400:
+                    error = 'database is locked' if b'database is locked' in payload else f'HTTP {response.status}'
+                out.append((kind, elapsed, response.status, error))
+            except (OSError, http.client.HTTPException) as e:
+                out.append((kind, time.perf_counter() - start, 0, type(e).__name__))
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(clients)]
+    for t in threads:
+        t.start()
+    deadline[0] = time.perf_counter() + duration
+    start_gate.wait()
+    for t in threads:
+        t.join()
+    return [sample for client_samples in samples for sample in client_samples]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def summarize(samples: List[Tuple[str, float, int, str]], duration: float) -> Dict[str, Dict]:
+    """
+    Throughput, latency percentiles and errors, per request type and in total
+
+    Returns:
+        {type or 'total': {requests, rps, p50_ms, p95_ms, p99_ms, max_ms,
+        errors, error_rate, locked, error_kinds}}
+    """
+    groups: Dict[str, List] = {'total': samples}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+
+    summary = {}
+    for name, group in groups.items():
+        latencies = sorted(s[1] for s in group)
+        errors = [s[3] for s in group if s[3]]
+        kinds: Dict[str, int] = {}
+        for error in errors:
+            kinds[error] = kinds.get(error, 0) + 1
+        summary[name] = {
+            'requests': len(group),
+            'rps': len(group) / duration,
+            'p50_ms': _percentile(latencies, 0.50) * 1000,
+            'p95_ms': _percentile(latencies, 0.95) * 1000,
+            'p99_ms': _percentile(latencies, 0.99) * 1000,
+            'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+            'errors': len(errors),
+            'error_rate': len(errors) / len(group) if group else 0.0,
+            'locked': kinds.get('database is locked', 0),
+            'error_kinds': kinds,
+        }
+    return summary
+
+
+def load_test(mode: str = 'dev', clients: int = 16, duration: float = 10.0, mix: str = DEFAULT_MIX,
+              users: int = 50, characters_per_user: int = 4, save: bool = True) -> Dict:
+    """
+    Run one load test: generate a database, start the server, apply load
+
+    Args:
+        mode: Serving mode (key of MODES)
+        clients: Number of concurrent clients
+        duration: Seconds of load
+        mix: Request type weights
+        users: Users in the generated database
+        characters_per_user: Characters per user
+        save: Write the result to load_results/
+
+    Returns:
+        Result dictionary with the configuration and the summary
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r} (use {', '.join(MODES)})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'load.db')
+        characters = generate_database(db_path, users, characters_per_user)
+        shard_count = int(MODES[mode][1].get('CYBERPUNK_SHARDS', '0'))
+        if shard_count > 1:
+            from db_helper import DatabaseHelper
+            from metrics import MetricsRegistry
+            sharded = DatabaseHelper(db_path, metrics=MetricsRegistry(), shard_count=shard_count)
+            sharded.shards.migrate_from_common()
+            sharded.shards.close()
+            targets = [t for path in sharded.shards.paths for t in _targets(path)]
+        else:
+            targets = _targets(db_path)
+
+        port = _free_port()
+        process = start_server(mode, db_path, port)
+        try:
+            samples = run_load(port, targets, clients, duration, mix)
+        finally:
+            stop_server(process)
+
+    result = {
+        'mode': mode,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'clients': clients,
+        'duration': duration,
+        'mix': mix,
+        'characters': characters,
+        'summary': summarize(samples, duration),
+    }
+    if save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{mode}-{clients}c.json"
+        result['path'] = os.path.join(RESULTS_DIR, name)
+        with open(result['path'], 'w') as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+# ==================== Reporting ====================
+
+def print_summary(result: Dict):
+    print(f"{result['mode']}: {result['clients']} clients, {result['duration']:.0f} s, "
+          f"mix {result['mix']}, {result['characters']} characters")
+    print(f"  {'type':8} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7} {'locked':>7}")
+    for name, stats in sorted(result['summary'].items(), key=lambda item: (item[0] == 'total', item[0])):
+        print(f"  {name:8} {stats['requests']:9} {stats['rps']:8.0f} {stats['p50_ms']:8.1f} "
+              f"{stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f} {stats['error_rate']:7.1%} {stats['locked']:7}")
+    other = {k: v for k, v in result['summary']['total']['error_kinds'].items() if k != 'database is locked'}
+    if other:
+        print(f"  other errors: {', '.join(f'{k} x{v}' for k, v in other.items())}")
+
+
+def compare(paths: List[str]):
+    """Print saved results side by side (newest result per mode and client count by default)"""
+    if not paths:
+        if not os.path.isdir(RESULTS_DIR):
+            print("No saved results yet")
+            return
+        latest = {}
+        for name in sorted(os.listdir(RESULTS_DIR)):
+            if name.endswith('.json'):
+                latest[name.split('-', 2)[2]] = os.path.join(RESULTS_DIR, name)
+        paths = list(latest.values())
+
+    print(f"{'mode':22} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7} {'locked':>7}  run")
+    for path in paths:
+        with open(path) as f:
+            result = json.load(f)
+        total = result['summary']['total']
+        print(f"{result['mode']:22} {result['clients']:7} {total['rps']:8.0f} {total['p50_ms']:8.1f} "
+              f"{total['p95_ms']:8.1f} {total['p99_ms']:8.1f} {total['error_rate']:7.1%} {total['locked']:7}  "
+              f"{result['timestamp']}")
+
+
+if __name__ == '__main__':
+    usage = f"""Usage:
+  python3 load_test.py run [mode] [clients] [seconds] [mix]   Run a load test and save the result
+  python3 load_test.py compare [result.json ...]             Compare saved results
+  python3 load_test.py modes                                 List serving modes
+
+Defaults: mode dev, 16 clients, 10 seconds, mix {DEFAULT_MIX}"""
+
+    if len(sys.argv) < 2:
+        print(usage)
+        sys.exit(1)
+
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == 'run':
+        mode = args[0] if args else 'dev'
+        clients = int(args[1]) if len(args) > 1 else 16
+        duration = float(args[2]) if len(args) > 2 else 10.0
+        mix = args[3] if len(args) > 3 else DEFAULT_MIX
+
+        print("Cyberpunk Tracker - Load Test")
+        print("=" * 50)
+        result = load_test(mode, clients, duration, mix)
+        print_summary(result)
+        print(f"\n✓ Saved to {result['path']}")
+    elif command == 'compare':
+        compare(args)
+    elif command == 'modes':
+        for name, (server, env) in MODES.items():
+            settings = ' '.join(f'{k}={v}' for k, v in env.items())
+            print(f"  {name:22} {server:9} {settings}")
+    else:
+        print(usage)
+        sys.exit(1)
@@ -0,0 +1,209 @@
+"""
+Map tile service for Cyberpunk Tracker
+Cuts map images into a zoom-level tile pyramid and caches the tiles on disk
+"""
+
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+from typing import Dict, Optional
+
+# Project root, used to resolve relative maps.image_path values
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class MapTileService:
+    """Builds and serves cached tile pyramids for rows in the maps table"""
+
+    def __init__(self, db, cache_dir: str, tile_size: int = 256):
+        """
+        Initialize the tile service
+
+        Args:
+            db: DatabaseHelper used to look up maps rows
+            cache_dir: Directory where tiles and manifests are stored
+            tile_size: Width and height of a full tile in pixels
+        """
+        self.db = db
+        self.cache_dir = cache_dir
+        self.tile_size = tile_size
+        self._manifests: Dict[int, Dict] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._cache_requests = db.metrics.counter(
+            'cyberpunk_cache_requests_total', 'Cache lookups by cache and result')
+
+    # ==================== Paths ====================
+
+    def _map_dir(self, map_id: int) -> str:
+        return os.path.join(self.cache_dir, str(map_id))
+
+    def _manifest_path(self, map_id: int) -> str:
+        return os.path.join(self._map_dir(map_id), 'manifest.json')
+
+    def tile_path(self, map_id: int, digest: str) -> str:
+        """Get the on-disk path of a content-hashed tile"""
+        return os.path.join(self._map_dir(map_id), f"{digest}.png")
+
+    @staticmethod
+    def resolve_image_path(image_path: str) -> str:
+        """Resolve maps.image_path (absolute, or relative to the project root)"""
+        if os.path.isabs(image_path):
+            return image_path
+        return os.path.join(PROJECT_ROOT, image_path)
+
+    # ==================== Manifest ====================
+
+    def _lock_for(self, map_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(map_id, threading.Lock())
+
+    def _fingerprint(self, map_row: Dict, source_path: str) -> str:
+        """
+        Fingerprint a maps row together with its image file
+
+        Any change to the row or to the image on disk produces a new value,
+        which invalidates the cached pyramid.
+        """
+        stat = os.stat(source_path)
+        payload = json.dumps(
+            [map_row, self.tile_size, stat.st_size, stat.st_mtime_ns],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _load_manifest(self, map_id: int) -> Optional[Dict]:
+        manifest = self._manifests.get(map_id)
+        if manifest is not None:
+            return manifest
+        try:
+            with open(self._manifest_path(map_id), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self._manifests[map_id] = manifest
+        return manifest
+
+    def get_manifest(self, map_id: int) -> Dict:
+        """
+        Get the tile manifest for a map, building the pyramid if needed
+
+        Args:
+            map_id: ID of the maps row
+
+        Returns:
+            Dictionary with image size, zoom levels and a "z/x/y" -> digest table
+
+        Raises:
+            LookupError: If the map does not exist or has no image
+            FileNotFoundError: If the image file is missing
+        """
+        map_row = self.db.get_map(map_id)
+        if not map_row:
+            raise LookupError(f"Map {map_id} not found")
+        if not map_row.get('image_path'):
+            raise LookupError(f"Map {map_id} has no image")
+
+        source_path = self.resolve_image_path(map_row['image_path'])
+        fingerprint = self._fingerprint(map_row, source_path)
+
+        manifest = self._load_manifest(map_id)
+        if manifest and manifest.get('fingerprint') == fingerprint:
+            self._cache_requests.inc(cache='map_tiles', result='hit')
+            return manifest
+
+        self._cache_requests.inc(cache='map_tiles', result='miss')
+        with self._lock_for(map_id):
+            # Another request may have rebuilt it while we waited
+            manifest = self._load_manifest(map_id)
+            if manifest and manifest.get('fingerprint') == fingerprint:
+                return manifest
+            manifest = self._build(map_id, source_path, fingerprint)
+            self._manifests[map_id] = manifest
+            return manifest
+
+    def get_tile_digest(self, map_id: int, z: int, x: int, y: int) -> Optional[str]:
+        """Get the content hash of a single tile, or None if out of range"""
+        manifest = self.get_manifest(map_id)
+        return manifest['tiles'].get(f"{z}/{x}/{y}")
+
+    # ==================== Building ====================
+
+    def _write_tile(self, map_id: int, tile) -> str:
+        """Encode a tile as PNG and store it under its content hash"""
+        buffer = io.BytesIO()
+        tile.save(buffer, format='PNG', optimize=True)
+        data = buffer.getvalue()
+        digest = hashlib.sha256(data).hexdigest()[:20]
+
+        path = self.tile_path(map_id, digest)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def _build(self, map_id: int, source_path: str, fingerprint: str) -> Dict:
+        """Cut the source image into tiles for every zoom level"""
+        try:
+            from PIL import Image
+        except ImportError:
+            raise RuntimeError("Pillow is required for map tiles (pip3 install Pillow)")
+
+        os.makedirs(self._map_dir(map_id), exist_ok=True)
+
+        with Image.open(source_path) as source:
+            source.load()
+            if source.mode not in ('RGB', 'RGBA'):
+                source = source.convert('RGBA')
+            width, height = source.size
+            max_zoom = max(0, math.ceil(math.log2(max(width, height) / self.tile_size)))
+
+            tiles = {}
+            for z in range(max_zoom, -1, -1):
+                scale = 2 ** (z - max_zoom)
+                level_w = max(1, math.ceil(width * scale))
+                level_h = max(1, math.ceil(height * scale))
+                level = source if scale == 1 else source.resize((level_w, level_h), Image.LANCZOS)
+
+                for x in range(math.ceil(level_w / self.tile_size)):
+                    for y in range(math.ceil(level_h / self.tile_size)):
+                        box = (
+                            x * self.tile_size,
+                            y * self.tile_size,
+                            min((x + 1) * self.tile_size, level_w),
+                            min((y + 1) * self.tile_size, level_h),
+                        )
+                        tiles[f"{z}/{x}/{y}"] = self._write_tile(map_id, level.crop(box))
+
+        manifest = {
+            'map_id': map_id,
+            'fingerprint': fingerprint,
+            'width': width,
+            'height': height,
+            'tile_size': self.tile_size,
+            'min_zoom': 0,
+            'max_zoom': max_zoom,
+            'tiles': tiles,
+        }
+
+        tmp_path = f"{self._manifest_path(map_id)}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path(map_id))
+
+        self._remove_stale_tiles(map_id, set(tiles.values()))
+        return manifest
+
+    def _remove_stale_tiles(self, map_id: int, keep: set):
+        """Delete tiles left over from a previous version of the map"""
+        for name in os.listdir(self._map_dir(map_id)):
+            if name.endswith('.png') and name[:-4] not in keep:
+                try:
+                    os.remove(os.path.join(self._map_dir(map_id), name))
+                except OSError:
+                    pass
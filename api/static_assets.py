@@ -0,0 +1,231 @@
+"""
+Static asset serving for Cyberpunk Tracker
+Serves the frontend (html/, css/, js/, images/) from the API process
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+from flask import Response, request, send_file
+
+# Content-hashed URLs never change content, so clients may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# File types worth gzipping (images are already compressed)
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.json', '.svg', '.txt'}
+
+# src="..." / href="..." attributes in HTML pages
+ASSET_REFERENCE = re.compile(r'''(src|href)=(["'])([^"'#?]+)\2''')
+
+
+class StaticAsset:
+    """A single frontend file and its precomputed variants"""
+
+    def __init__(self, rel_path: str, abs_path: str, data: bytes):
+        self.rel_path = rel_path
+        self.abs_path = abs_path
+        self.mimetype = mimetypes.guess_type(abs_path)[0] or 'application/octet-stream'
+        self.size = len(data)
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+
+        base, ext = os.path.splitext(rel_path)
+        self.ext = ext.lower()
+        self.fingerprinted_path = f"{base}.{self.digest}{ext}"
+
+        # Filled in by StaticAssetServer depending on size limits
+        self.body: Optional[bytes] = None
+        self.gzip_body: Optional[bytes] = None
+        self.gzip_path: Optional[str] = None
+
+
+class StaticAssetServer:
+    """Indexes, precompresses and serves frontend files"""
+
+    def __init__(self, root: str, directories=('html', 'css', 'js', 'images'),
+                 gzip_dir: Optional[str] = None, memory_limit: int = 64 * 1024,
+                 metrics=None):
+        """
+        Initialize the asset server and build the asset index
+
+        Args:
+            root: Project root that contains the asset directories
+            directories: Subdirectories of root that are served
+            gzip_dir: Where gzip variants of large files are written
+            memory_limit: Files up to this size are kept in memory
+            metrics: Optional MetricsRegistry for memory cache hit/miss counts
+        """
+        self.root = os.path.abspath(root)
+        self.directories = directories
+        self.gzip_dir = gzip_dir
+        self.memory_limit = memory_limit
+        self._assets: Dict[str, StaticAsset] = {}
+        self._fingerprinted: Dict[str, StaticAsset] = {}
+        self._cache_requests = metrics.counter(
+            'cyberpunk_cache_requests_total', 'Cache lookups by cache and result') if metrics else None
+        self.build()
+
+    # ==================== Index ====================
+
+    def _walk(self):
+        for directory in self.directories:
+            base = os.path.join(self.root, directory)
+            for dirpath, _, filenames in os.walk(base):
+                for filename in sorted(filenames):
+                    abs_path = os.path.join(dirpath, filename)
+                    rel_path = os.path.relpath(abs_path, self.root).replace(os.sep, '/')
+                    yield rel_path, abs_path
+
+    def _rewrite_html(self, rel_path: str, html: bytes) -> bytes:
+        """Point asset references in an HTML page at their fingerprinted names"""
+        page_dir = os.path.dirname(rel_path)
+
+        def replace(match):
+            attr, quote, url = match.groups()
+            if '://' in url or url.startswith('/'):
+                return match.group(0)
+            target = os.path.normpath(os.path.join(page_dir, url)).replace(os.sep, '/')
+            asset = self._assets.get(target)
+            if not asset or asset.ext == '.html':
+                return match.group(0)
+            # Keep the reference relative so the page works from any mount point
+            new_url = url[:len(url) - len(os.path.basename(url))] + os.path.basename(asset.fingerprinted_path)
+            return f"{attr}={quote}{new_url}{quote}"
+
+        return ASSET_REFERENCE.sub(replace, html.decode('utf-8')).encode('utf-8')
+
+    def _prepare(self, asset: StaticAsset, data: bytes):
+        """Keep small files in memory and build gzip variants"""
+        if asset.size <= self.memory_limit:
+            asset.body = data
+
+        if asset.ext not in COMPRESSIBLE_EXTENSIONS:
+            return
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) >= asset.size:
+            return
+        if len(compressed) <= self.memory_limit or not self.gzip_dir:
+            asset.gzip_body = compressed
+        else:
+            os.makedirs(self.gzip_dir, exist_ok=True)
+            asset.gzip_path = os.path.join(self.gzip_dir, asset.fingerprinted_path.replace('/', '_') + '.gz')
+            if not os.path.exists(asset.gzip_path):
+                with open(asset.gzip_path, 'wb') as f:
+                    f.write(compressed)
+
+    def build(self) -> int:
+        """
+        Scan the asset directories and rebuild the index
+
+        HTML pages are indexed last, because their references to other
+        assets are rewritten to fingerprinted names.
+
+        Returns:
+            Number of assets indexed
+        """
+        self._assets = {}
+        pages = []
+        for rel_path, abs_path in self._walk():
+            with open(abs_path, 'rb') as f:
+                data = f.read()
+            if rel_path.lower().endswith('.html'):
+                pages.append((rel_path, abs_path, data))
+                continue
+            asset = StaticAsset(rel_path, abs_path, data)
+            self._prepare(asset, data)
+            self._assets[rel_path] = asset
+
+        for rel_path, abs_path, data in pages:
+            data = self._rewrite_html(rel_path, data)
+            asset = StaticAsset(rel_path, abs_path, data)
+            # Rewritten pages differ from the file on disk, so always keep them in memory
+            asset.body = data
+            self._prepare(asset, data)
+            self._assets[rel_path] = asset
+
+        self._fingerprinted = {a.fingerprinted_path: a for a in self._assets.values()}
+        self._remove_stale_gzip({a.gzip_path for a in self._assets.values() if a.gzip_path})
+        return len(self._assets)
+
+    def _remove_stale_gzip(self, keep: set):
+        """Delete gzip variants of files that changed or were removed since they were written"""
+        if not self.gzip_dir or not os.path.isdir(self.gzip_dir):
+            return
+        for name in os.listdir(self.gzip_dir):
+            path = os.path.join(self.gzip_dir, name)
+            if name.endswith('.gz') and path not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def lookup(self, path: str) -> Tuple[Optional[StaticAsset], bool]:
+        """
+        Find an asset by plain or fingerprinted path
+
+        Returns:
+            Tuple of (asset or None, whether the path was fingerprinted)
+        """
+        asset = self._fingerprinted.get(path)
+        if asset:
+            return asset, True
+        return self._assets.get(path), False
+
+    # ==================== Serving ====================
+
+    def serve(self, path: str) -> Optional[Response]:
+        """
+        Build a response for an asset request
+
+        Args:
+            path: Request path relative to the project root
+
+        Returns:
+            Flask response, or None if no such asset exists
+        """
+        asset, fingerprinted = self.lookup(path)
+        if not asset:
+            return None
+
+        use_gzip = (asset.gzip_body is not None or asset.gzip_path is not None) \
+            and request.accept_encodings['gzip'] > 0
+        etag = f"{asset.digest}-gz" if use_gzip else asset.digest
+
+        if use_gzip and asset.gzip_body is None:
+            response = send_file(asset.gzip_path, mimetype=asset.mimetype, conditional=True, etag=etag)
+        elif use_gzip:
+            response = Response(asset.gzip_body, mimetype=asset.mimetype)
+        elif asset.body is not None:
+            response = Response(asset.body, mimetype=asset.mimetype)
+        else:
+            # Large files go through the WSGI file wrapper (sendfile under gunicorn)
+            response = send_file(asset.abs_path, mimetype=asset.mimetype, conditional=True, etag=etag)
+
+        if self._cache_requests:
+            in_memory = asset.gzip_body is not None if use_gzip else asset.body is not None
+            self._cache_requests.inc(cache='static_assets', result='hit' if in_memory else 'miss')
+
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        if asset.ext in COMPRESSIBLE_EXTENSIONS:
+            response.vary.add('Accept-Encoding')
+
+        if fingerprinted:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            # Plain names may change content; revalidate with the ETag
+            response.cache_control.no_cache = True
+            response.cache_control.max_age = None
+
+        if response.direct_passthrough:
+            return response
+        response.set_etag(etag)
+        if use_gzip:
+            return response.make_conditional(request)
+        return response.make_conditional(request, accept_ranges=True, complete_length=asset.size)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Hot/cold archival for Cyberpunk Tracker
+Moves inactive status effects and healed critical injuries into archive tables
+"""
+
+from typing import Dict, List
+
+# Hot table -> (archive table, flag column, flag value of resolved rows, columns moved)
+ARCHIVED_TABLES = {
+    'status_effects': (
+        'status_effects_archive', 'active', 0,
+        ('effect_id', 'character_id', 'effect_name', 'effect_type', 'description', 'duration', 'active'),
+    ),
+    'critical_injuries': (
+        'critical_injuries_archive', 'healed', 1,
+        ('injury_id', 'character_id', 'injury_name', 'description', 'date_received', 'healed'),
+    ),
+}
+
+
+def _trigger_sql(table: str, event: str) -> str:
+    """Trigger that archives a row as soon as it is inserted or updated as resolved"""
+    archive, flag, resolved, columns = ARCHIVED_TABLES[table]
+    values = ', '.join(f'NEW.{column}' for column in columns)
+    on = 'INSERT' if event == 'insert' else f'UPDATE OF {flag}'
+    return f"""
+        CREATE TRIGGER trg_archive_{table}_{event}
+        AFTER {on} ON {table} WHEN NEW.{flag} = {resolved}
+        BEGIN
+            INSERT OR REPLACE INTO {archive} ({', '.join(columns)}) VALUES ({values});
+            DELETE FROM {table} WHERE {columns[0]} = NEW.{columns[0]};
+        END
+    """
+
+
+TRIGGERS = {
+    f'trg_archive_{table}_{event}': _trigger_sql(table, event)
+    for table in ARCHIVED_TABLES
+    for event in ('insert', 'update')
+}
+
+
+def _replace_triggers(conn, install: bool):
+    """Drop the archive triggers, then create them again if `install` is set"""
+    for name, sql in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        if install:
+            conn.execute(sql)
+
+
+class Archiver:
+    """
+    Keeps resolved rows out of the hot tables
+
+    Character sheets only show active effects and open injuries, so
+    resolved rows only make the hot tables and their indexes bigger. They
+    are moved to the archive tables, either in batches by archive() (on a
+    schedule, see jobs.py) or immediately by triggers (install_triggers()).
+    history() serves both archived rows and resolved rows not yet moved.
+    """
+
+    def __init__(self, db, batch_size: int = 1000):
+        """
+        Initialize the archiver
+
+        Args:
+            db: DatabaseHelper (every shard is archived when sharded)
+            batch_size: Rows moved per transaction, so writers are not blocked for long
+        """
+        self.db = db
+        self.batch_size = batch_size
+
+    def archive(self) -> Dict[str, int]:
+        """
+        Move all resolved rows to the archive tables
+
+        Returns:
+            Number of rows moved per hot table
+        """
+        moved = {table: 0 for table in ARCHIVED_TABLES}
+        for helper in self.db.character_helpers():
+            for table in ARCHIVED_TABLES:
+                while True:
+                    # One batch per transaction, through the write queue when there is one
+                    count = helper.transaction(lambda conn: self._archive_batch(conn, table), 'archive')
+                    if not count:
+                        break
+                    moved[table] += count
+        return moved
+
+    def _archive_batch(self, conn, table: str) -> int:
+        """Move up to batch_size resolved rows of a hot table (the row IDs pin both statements to the same rows)"""
+        archive, flag, resolved, columns = ARCHIVED_TABLES[table]
+        column_list = ', '.join(columns)
+        ids = [row[0] for row in conn.execute(
+            f"SELECT {columns[0]} FROM {table} WHERE {flag} = {resolved} LIMIT ?", (self.batch_size,)
+        )]
+        if ids:
+            placeholders = ', '.join(['?'] * len(ids))
+            conn.execute(
+                f"INSERT OR REPLACE INTO {archive} ({column_list}) "
+                f"SELECT {column_list} FROM {table} WHERE {columns[0]} IN ({placeholders})", ids
+            )
+            conn.execute(f"DELETE FROM {table} WHERE {columns[0]} IN ({placeholders})", ids)
+        return len(ids)
+
+    def history(self, character_id: int, limit: int = 100) -> Dict[str, List[Dict]]:
+        """
+        Get a character's resolved status effects and critical injuries
+
+        Args:
+            character_id: Character to look up
+            limit: Maximum rows per table, newest first
+
+        Returns:
+            Dictionary with 'status_effects' and 'critical_injuries' lists
+        """
+        helper = self.db.for_character(character_id)
+        history = {}
+        for table, (archive, flag, resolved, columns) in ARCHIVED_TABLES.items():
+            column_list = ', '.join(columns)
+            history[table] = helper.execute_query(
+                f"SELECT {column_list}, NULL AS archived_at FROM {table} "
+                f"WHERE character_id = ? AND {flag} = {resolved} "
+                f"UNION ALL "
+                f"SELECT {column_list}, archived_at FROM {archive} WHERE character_id = ? "
+                f"ORDER BY {columns[0]} DESC LIMIT ?",
+                (character_id, character_id, limit)
+            )
+        return history
+
+    def status(self) -> Dict[str, Dict[str, int]]:
+        """Active, resolved-but-not-archived and archived row counts per table"""
+        status = {}
+        for table, (archive, flag, resolved, _) in ARCHIVED_TABLES.items():
+            counts = {'hot': 0, 'resolved': 0, 'archived': 0}
+            for helper in self.db.character_helpers():
+                row = helper.execute_query(
+                    f"SELECT (SELECT COUNT(*) FROM {table}) AS hot, "
+                    f"(SELECT COUNT(*) FROM {table} WHERE {flag} = {resolved}) AS resolved, "
+                    f"(SELECT COUNT(*) FROM {archive}) AS archived"
+                )[0]
+                for key in counts:
+                    counts[key] += row[key]
+            status[table] = counts
+        return status
+
+    # ==================== Archive on Resolve ====================
+
+    def install_triggers(self) -> Dict[str, int]:
+        """
+        Archive rows the moment they are resolved
+
+        Rows resolved before the triggers existed are archived right away.
+
+        Returns:
+            Number of backlog rows moved per hot table
+        """
+        for helper in self.db.character_helpers():
+            helper.transaction(lambda conn: _replace_triggers(conn, install=True), 'archive_triggers')
+        return self.archive()
+
+    def remove_triggers(self):
+        """Go back to archiving in batches only"""
+        for helper in self.db.character_helpers():
+            helper.transaction(lambda conn: _replace_triggers(conn, install=False), 'archive_triggers')
+
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    from db_helper import DatabaseHelper
+
+    usage = """Usage:
+  python3 archive.py run [db_path]                  Move resolved rows to the archive tables now
+  python3 archive.py status [db_path]               Row counts in the hot and archive tables
+  python3 archive.py triggers on|off [db_path]      Archive rows as soon as they are resolved
+  python3 archive.py history <character_id> [db_path]"""
+
+    if len(sys.argv) < 2:
+        print(usage)
+        sys.exit(1)
+
+    command, args = sys.argv[1], sys.argv[2:]
+    if command in ('triggers', 'history'):
+        if not args or (command == 'triggers' and args[0] not in ('on', 'off')):
+            print(usage)
+            sys.exit(1)
+        db_path = args[1] if len(args) > 1 else 'cyberpunk_tracker.db'
+    else:
+        db_path = args[0] if args else 'cyberpunk_tracker.db'
+
+    shard_count = int(os.environ.get('CYBERPUNK_SHARDS', '0'))
+    archiver = Archiver(DatabaseHelper(db_path, shard_count=shard_count))
+
+    if command == 'run':
+        for table, count in archiver.archive().items():
+            print(f"✓ Archived {count} rows from {table}")
+    elif command == 'status':
+        for table, counts in archiver.status().items():
+            print(f"  {table}: {counts['hot']} hot ({counts['resolved']} resolved), "
+                  f"{counts['archived']} archived")
+    elif command == 'triggers' and args[0] == 'on':
+        moved = archiver.install_triggers()
+        print(f"✓ Archive triggers installed ({sum(moved.values())} resolved rows archived)")
+    elif command == 'triggers':
+        archiver.remove_triggers()
+        print("✓ Archive triggers removed")
+    elif command == 'history':
+        for table, rows in archiver.history(int(args[0])).items():
+            print(f"{table}:")
+            for row in rows:
+                name = row.get('effect_name') or row.get('injury_name')
+                print(f"  - {name} (archived {row['archived_at'] or 'not yet'})")
+    else:
+        print(usage)
+        sys.exit(1)
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Online backups for Cyberpunk Tracker
+Copies the live database with the SQLite backup API, a few pages at a time
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+
+def connect_readonly(path: str) -> sqlite3.Connection:
+    """Open an existing database read-only (a missing file raises instead of being created)"""
+    return sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+
+
+class _TooManyRestarts(Exception):
+    """Raised from the progress callback to abandon a stepped backup"""
+
+
+def backup_database(source_path: str, dest_path: str, pages: int = 64,
+                    step_sleep: float = 0.005,
+                    progress: Optional[Callable[[int, int], None]] = None,
+                    max_restarts: int = 3) -> int:
+    """
+    Copy a database that may be in use into another file
+
+    The copy is done in steps of `pages` pages. SQLite only holds the read
+    lock on the source while a step runs, and we sleep between steps, so
+    API readers and writers keep going while the backup is in progress.
+    If a write lands mid-backup, SQLite restarts the copy so the result is
+    always a consistent snapshot. Under steady write traffic it could
+    restart forever, so after `max_restarts` restarts the rest is copied in
+    one step, holding the read lock (and making writers wait) until done.
+
+    Args:
+        source_path: Database to copy
+        dest_path: File to write the copy to (overwritten)
+        pages: Pages copied per step (-1 copies everything in one step)
+        step_sleep: Seconds to sleep between steps
+        progress: Optional callback(remaining, total) after each step
+        max_restarts: Restarts allowed before falling back to a single step
+
+    Returns:
+        Number of pages in the copy
+
+    Raises:
+        sqlite3.OperationalError: If the source file doesn't exist
+    """
+    total_pages = 0
+    last_remaining = None
+    restarts = 0
+
+    def on_step(status, remaining, total):
+        nonlocal total_pages, last_remaining, restarts
+        total_pages = total
+        if progress:
+            progress(remaining, total)
+        # A write to the source sends the copy back to the first page
+        if last_remaining is not None and remaining >= last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        if remaining and step_sleep:
+            time.sleep(step_sleep)
+
+    source = connect_readonly(source_path)
+    dest = sqlite3.connect(dest_path)
+    try:
+        try:
+            source.backup(dest, pages=pages, progress=on_step)
+        except _TooManyRestarts:
+            source.backup(dest, pages=-1, progress=on_step)
+    finally:
+        dest.close()
+        source.close()
+    return total_pages
+
+
+def check_integrity(db_path: str) -> bool:
+    """Run PRAGMA quick_check on a database file (False if it doesn't exist)"""
+    try:
+        conn = connect_readonly(db_path)
+    except sqlite3.OperationalError:
+        return False
+    try:
+        return conn.execute("PRAGMA quick_check").fetchone()[0] == 'ok'
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        conn.close()
+
+
+class BackupManager:
+    """Takes timestamped snapshots, prunes old ones and restores them"""
+
+    def __init__(self, db_path: str, backup_dir: Optional[str] = None, keep: int = 7,
+                 pages: int = 64, step_sleep: float = 0.005, shard_paths: Sequence[str] = ()):
+        """
+        Initialize the backup manager
+
+        Args:
+            db_path: Live database file
+            backup_dir: Where snapshots are stored (defaults to backups/ next to the database)
+            keep: Number of snapshots kept by prune()
+            pages: Pages copied per backup step
+            step_sleep: Seconds to sleep between backup steps
+            shard_paths: Shard files snapshotted and restored along with the
+                database, as one set with the same timestamp
+        """
+        self.db_path = db_path
+        self.shard_paths = list(shard_paths)
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+        self.keep = keep
+        self.pages = pages
+        self.step_sleep = step_sleep
+
+    def _prefix(self, db_path: Optional[str] = None) -> str:
+        return os.path.splitext(os.path.basename(db_path or self.db_path))[0] + '-'
+
+    def _set_paths(self, backup_path: str) -> List[str]:
+        """Snapshot files of the set `backup_path` belongs to, in db_path + shard_paths order"""
+        directory, name = os.path.split(backup_path)
+        stamp = name[len(self._prefix()):]
+        return [backup_path] + [os.path.join(directory, self._prefix(path) + stamp)
+                                for path in self.shard_paths]
+
+    def _copy_set(self, tmp_paths: List[str]):
+        """
+        Copy the database and its shards as of one moment
+
+        All files are read in a single read transaction, so a character
+        moved between shards is in exactly one file of the set. No writer
+        can commit while it is open, so the whole set is copied at once
+        rather than in steps.
+        """
+        source = connect_readonly(self.db_path)
+        source.isolation_level = None
+        try:
+            schemas = ['main']
+            for n, path in enumerate(self.shard_paths):
+                schemas.append(f"shard{n}")
+                source.execute(f"ATTACH DATABASE ? AS shard{n}",
+                               (f"file:{quote(os.path.abspath(path))}?mode=ro",))
+            source.execute("BEGIN")
+            for schema in schemas:
+                source.execute(f"SELECT COUNT(*) FROM {schema}.sqlite_master").fetchone()
+            for schema, tmp_path in zip(schemas, tmp_paths):
+                dest = sqlite3.connect(tmp_path)
+                try:
+                    source.backup(dest, pages=-1, name=schema)
+                finally:
+                    dest.close()
+            source.execute("COMMIT")
+        finally:
+            source.close()
+
+    def snapshot(self, prune: bool = True) -> str:
+        """
+        Take a snapshot of the live database (and its shards) and prune old snapshots
+
+        The copy is written to a temporary file and renamed when complete,
+        so a crash never leaves a half-written snapshot behind. Shard files
+        are copied together with the database in one read transaction,
+        which makes writers wait until the whole set is copied.
+
+        Args:
+            prune: Delete snapshots beyond the retention limit afterwards
+
+        Returns:
+            Path of the new snapshot (of the database itself, for a set)
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        paths = self._set_paths(os.path.join(self.backup_dir, f"{self._prefix()}{stamp}.db"))
+        tmp_paths = [path + '.tmp' for path in paths]
+        if self.shard_paths:
+            self._copy_set(tmp_paths)
+        else:
+            backup_database(self.db_path, tmp_paths[0], pages=self.pages, step_sleep=self.step_sleep)
+        for tmp_path, path in zip(tmp_paths, paths):
+            os.replace(tmp_path, path)
+        if prune:
+            self.prune()
+        return paths[0]
+
+    def list_backups(self, db_path: Optional[str] = None) -> List[str]:
+        """List snapshot paths of the database (or of one of its shard files), newest first"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        prefix = self._prefix(db_path)
+        names = [n for n in os.listdir(self.backup_dir)
+                 if n.startswith(prefix) and n.endswith('.db')]
+        # Timestamps sort lexicographically
+        return [os.path.join(self.backup_dir, n) for n in sorted(names, reverse=True)]
+
+    def prune(self) -> List[str]:
+        """
+        Delete snapshots beyond the retention limit
+
+        Returns:
+            Paths of deleted snapshots
+        """
+        removed = []
+        for db_path in [self.db_path] + self.shard_paths:
+            removed += self.list_backups(db_path)[self.keep:]
+        for path in removed:
+            os.remove(path)
+        return removed
+
+    def restore(self, backup_path: str, safety_snapshot: bool = True) -> Optional[str]:
+        """
+        Restore the live database (and its shards) from a snapshot
+
+        The snapshot is copied into the live file with the backup API, which
+        takes the write lock, so it is safe while the API is running; open
+        connections see the restored data on their next query. With shards,
+        the shard snapshots taken with it are restored too, one file after
+        the other, so stop the API first to keep requests from seeing a mix
+        of old and new files.
+
+        Args:
+            backup_path: Snapshot of the database to restore
+            safety_snapshot: Snapshot the current database first
+
+        Returns:
+            Path of the safety snapshot, if one was taken (old snapshots
+            are pruned by the next scheduled snapshot)
+
+        Raises:
+            ValueError: If a snapshot of the set is missing or fails its integrity check
+        """
+        backup_paths = self._set_paths(backup_path)
+        for path in backup_paths:
+            if not check_integrity(path):
+                raise ValueError(f"Backup {path} failed integrity check")
+
+        safety_path = None
+        if safety_snapshot and os.path.exists(self.db_path):
+            # Not pruned: with the retention limit reached, pruning could
+            # delete the very snapshot being restored
+            safety_path = self.snapshot(prune=False)
+
+        for path, db_path in zip(backup_paths, [self.db_path] + self.shard_paths):
+            backup_database(path, db_path, pages=-1, step_sleep=0)
+        return safety_path
+
+
+
+def measure_backup_impact(db_path: str, duration: float = 2.0, readers: int = 4,
+                          pages: int = 64, step_sleep: float = 0.005) -> Dict[str, Dict[str, float]]:
+    """
+    Measure query latency with and without a backup running
+
+    Reader threads run character lookups and one writer thread changes HP,
+    first on their own and then while snapshots are taken back to back.
+    Every write changes a row, so snapshots restart as they would under
+    real traffic. The benchmark runs on a copy, leaving `db_path` as it was.
+
+    Args:
+        db_path: Database to copy and test against (should contain characters)
+        duration: Seconds per phase
+        readers: Number of reader threads
+        pages: Pages copied per backup step
+        step_sleep: Seconds to sleep between backup steps
+
+    Returns:
+        Dictionary with p50/p99/max latency in ms and query count per phase
+    """
+    import tempfile
+    from db_helper import DatabaseHelper
+    from metrics import MetricsRegistry
+
+    def phase(db, with_backup: bool) -> Dict[str, float]:
+        latencies: List[float] = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def reader(offset):
+            i = offset
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                db.get_character(character_ids[i % len(character_ids)])
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                i += 1
+
+        def writer():
+            i = 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    db.execute_update("UPDATE characters SET hp = ? WHERE character_id = ?",
+                                      (i % 50 + 1, character_ids[i % len(character_ids)]))
+                except sqlite3.OperationalError:
+                    pass
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                i += 1
+                time.sleep(0.001)
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        for t in threads:
+            t.start()
+
+        snapshots = 0
+        if with_backup:
+            while time.perf_counter() < deadline:
+                backup_database(db.db_path, db.db_path + '.backup', pages=pages, step_sleep=step_sleep)
+                snapshots += 1
+
+        for t in threads:
+            t.join()
+
+        latencies.sort()
+        return {
+            'queries': len(latencies),
+            'snapshots': snapshots,
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+            'max_ms': latencies[-1] * 1000,
+        }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        copy_path = os.path.join(tmp, 'impact.db')
+        backup_database(db_path, copy_path, pages=-1, step_sleep=0)
+        db = DatabaseHelper(copy_path, metrics=MetricsRegistry(), slow_query_threshold=None)
+        character_ids = [r['character_id'] for r in db.execute_query("SELECT character_id FROM characters")] or [1]
+        return {'baseline': phase(db, False), 'during_backup': phase(db, True)}
+
+
+if __name__ == '__main__':
+    import sys
+
+    usage = """Usage:
+  python3 backup.py snapshot [db_path]        Take a snapshot now
+  python3 backup.py list [db_path]            List snapshots
+  python3 backup.py restore <backup> [db_path] Restore a snapshot
+  python3 backup.py impact [db_path]          Measure latency impact on queries"""
+
+    if len(sys.argv) < 2:
+        print(usage)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == 'restore':
+        if len(sys.argv) < 3:
+            print(usage)
+            sys.exit(1)
+        db_path = sys.argv[3] if len(sys.argv) > 3 else 'cyberpunk_tracker.db'
+    else:
+        db_path = sys.argv[2] if len(sys.argv) > 2 else 'cyberpunk_tracker.db'
+    shard_count = int(os.environ.get('CYBERPUNK_SHARDS', '0'))
+    if command in ('snapshot', 'restore') and shard_count > 1:
+        from sharding import shard_path
+        manager = BackupManager(db_path, shard_paths=[shard_path(db_path, i) for i in range(shard_count)])
+    else:
+        manager = BackupManager(db_path)
+
+    if command == 'snapshot':
+        print(f"✓ Snapshot written to {manager.snapshot()}")
+    elif command == 'list':
+        for path in manager.list_backups():
+            print(f"  - {path} ({os.path.getsize(path) // 1024} KB)")
+    elif command == 'restore':
+        safety = manager.restore(sys.argv[2])
+        print(f"✓ Restored {db_path} from {sys.argv[2]}")
+        if safety:
+            print(f"  Previous database saved as {safety}")
+    elif command == 'impact':
+        results = measure_backup_impact(db_path)
+        for name, stats in results.items():
+            print(f"{name}: {stats['queries']} queries, p50 {stats['p50_ms']:.2f} ms, "
+                  f"p99 {stats['p99_ms']:.2f} ms, max {stats['max_ms']:.2f} ms"
+                  + (f", {stats['snapshots']} snapshots" if stats['snapshots'] else ''))
+    else:
+        print(usage)
+        sys.exit(1)
@@ -0,0 +1,242 @@
+"""
+Combat round mutations for Cyberpunk Tracker
+Applies a round's HP, ammo, status effect and critical injury changes in one transaction
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MUTATION_TYPES = ('hp', 'ammo', 'status_effect', 'critical_injury')
+EFFECT_TYPES = ('buff', 'debuff', 'condition', 'other')
+
+# Limits on a round, so requests stay cheap and every value fits in an SQLite integer
+MAX_MUTATIONS = 1000
+MAX_DELTA = 1_000_000
+MAX_ID = 2 ** 63 - 1
+
+# HP never goes below 0, nor above max_hp when the character has one
+HP_UPDATE = """
+    UPDATE characters
+    SET hp = MAX(CASE WHEN max_hp > 0 THEN MIN(hp + :delta, max_hp) ELSE hp + :delta END, 0),
+        last_modified = CURRENT_TIMESTAMP
+    WHERE character_id = :character_id
+"""
+AMMO_UPDATE = "UPDATE ammo SET quantity = quantity + :delta WHERE ammo_id = :ammo_id AND character_id = :character_id"
+EFFECT_INSERT = """
+    INSERT INTO status_effects (character_id, effect_name, effect_type, description, duration)
+    VALUES (:character_id, :effect_name, :effect_type, :description, :duration)
+"""
+INJURY_INSERT = """
+    INSERT INTO critical_injuries (character_id, injury_name, description)
+    VALUES (:character_id, :injury_name, :description)
+"""
+
+
+def _int(mutation: Dict, key: str, index: int, low: int, high: int) -> int:
+    value = mutation.get(key)
+    if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+        raise ValueError(f"Mutation {index}: '{key}' must be an integer from {low} to {high}")
+    return value
+
+
+def _text(mutation: Dict, key: str, index: int, required: bool = False) -> Optional[str]:
+    value = mutation.get(key)
+    if value is None and not required:
+        return None
+    if not isinstance(value, str) or (required and not value):
+        raise ValueError(f"Mutation {index}: '{key}' must be a {'non-empty ' if required else ''}string")
+    return value
+
+
+def parse_round(mutations: List[Dict]) -> Dict[str, List[Dict]]:
+    """
+    Validate a round and group its mutations by statement
+
+    HP and ammo deltas for the same target are summed, so each row is
+    updated once per round.
+
+    Args:
+        mutations: List of mutations, each with a 'type' and a 'character_id':
+            {'type': 'hp', 'character_id': 1, 'delta': -7}
+            {'type': 'ammo', 'character_id': 1, 'ammo_id': 3, 'delta': -2}
+            {'type': 'status_effect', 'character_id': 2, 'effect_name': 'Stunned',
+             'effect_type': 'condition', 'description': '...', 'duration': '1 round'}
+            {'type': 'critical_injury', 'character_id': 2, 'injury_name': 'Broken Arm',
+             'description': '...'}
+
+    Returns:
+        Parameter lists keyed by mutation type
+
+    Raises:
+        ValueError: If a mutation is malformed or out of range
+    """
+    if not isinstance(mutations, list) or not mutations:
+        raise ValueError("'mutations' must be a non-empty list")
+    if len(mutations) > MAX_MUTATIONS:
+        raise ValueError(f"A round has at most {MAX_MUTATIONS} mutations")
+
+    hp: Dict[int, int] = {}
+    ammo: Dict[Tuple[int, int], int] = {}
+    effects, injuries = [], []
+    for index, mutation in enumerate(mutations):
+        if not isinstance(mutation, dict) or mutation.get('type') not in MUTATION_TYPES:
+            raise ValueError(f"Mutation {index}: 'type' must be one of {', '.join(MUTATION_TYPES)}")
+        character_id = _int(mutation, 'character_id', index, 1, MAX_ID)
+        kind = mutation['type']
+
+        if kind == 'hp':
+            hp[character_id] = hp.get(character_id, 0) + _int(mutation, 'delta', index, -MAX_DELTA, MAX_DELTA)
+        elif kind == 'ammo':
+            key = (character_id, _int(mutation, 'ammo_id', index, 1, MAX_ID))
+            ammo[key] = ammo.get(key, 0) + _int(mutation, 'delta', index, -MAX_DELTA, MAX_DELTA)
+        elif kind == 'status_effect':
+            effect_type = mutation.get('effect_type', 'condition')
+            if effect_type not in EFFECT_TYPES:
+                raise ValueError(f"Mutation {index}: 'effect_type' must be one of {', '.join(EFFECT_TYPES)}")
+            effects.append({
+                'character_id': character_id, 'effect_name': _text(mutation, 'effect_name', index, required=True),
+                'effect_type': effect_type, 'description': _text(mutation, 'description', index),
+                'duration': _text(mutation, 'duration', index),
+            })
+        else:
+            injuries.append({
+                'character_id': character_id, 'injury_name': _text(mutation, 'injury_name', index, required=True),
+                'description': _text(mutation, 'description', index),
+            })
+
+    return {
+        'hp': [{'character_id': cid, 'delta': delta} for cid, delta in hp.items()],
+        'ammo': [{'character_id': cid, 'ammo_id': aid, 'delta': delta} for (cid, aid), delta in ammo.items()],
+        'status_effect': effects,
+        'critical_injury': injuries,
+    }
+
+
+def _placeholders(values) -> str:
+    return ', '.join(['?'] * len(values))
+
+
+def _apply(conn, statements: Dict[str, List[Dict]], character_ids: List[int]):
+    """Apply a round's statements on one connection and check invariants"""
+    found = {row[0] for row in conn.execute(
+        f"SELECT character_id FROM characters WHERE character_id IN ({_placeholders(character_ids)})",
+        character_ids
+    )}
+    missing = sorted(set(character_ids) - found)
+    if missing:
+        raise ValueError(f"Character {missing[0]} not found")
+
+    conn.executemany(HP_UPDATE, statements['hp'])
+    conn.executemany(EFFECT_INSERT, statements['status_effect'])
+    conn.executemany(INJURY_INSERT, statements['critical_injury'])
+
+    if statements['ammo']:
+        conn.executemany(AMMO_UPDATE, statements['ammo'])
+        ammo_ids = [row['ammo_id'] for row in statements['ammo']]
+        quantities = {(row[0], row[1]): row[2] for row in conn.execute(
+            f"SELECT character_id, ammo_id, quantity FROM ammo WHERE ammo_id IN ({_placeholders(ammo_ids)})",
+            ammo_ids
+        )}
+        for row in statements['ammo']:
+            key = (row['character_id'], row['ammo_id'])
+            if key not in quantities:
+                raise ValueError(f"Ammo {row['ammo_id']} not found for character {row['character_id']}")
+            if quantities[key] < 0:
+                raise ValueError(
+                    f"Not enough ammo: ammo {row['ammo_id']} of character {row['character_id']} "
+                    f"would drop to {quantities[key]}"
+                )
+
+
+def _by_helper(db, character_ids: Iterable[int]) -> List[Tuple[object, List[int]]]:
+    """Group characters by the helper (shard) holding them, in a fixed order"""
+    groups: Dict[str, Tuple[object, List[int]]] = {}
+    for character_id in character_ids:
+        helper = db.for_character(character_id)
+        groups.setdefault(helper.db_path, (helper, []))[1].append(character_id)
+    # Locking shards in path order keeps two rounds from deadlocking
+    return [groups[path] for path in sorted(groups)]
+
+
+def _apply_chain(groups: List[Tuple[object, List[int]]], statements: Dict[str, List[Dict]]):
+    """
+    Apply a round on each helper's database, one transaction nested in the next
+
+    The first helper's transaction runs the next helper's transaction
+    before it commits, so a failed check anywhere rolls back every shard.
+    """
+    (helper, ids), rest = groups[0], groups[1:]
+    shard_ids = set(ids)
+    part = {kind: [row for row in rows if row['character_id'] in shard_ids]
+            for kind, rows in statements.items()}
+
+    def work(conn):
+        _apply(conn, part, ids)
+        if rest:
+            _apply_chain(rest, statements)
+
+    helper.transaction(work, 'combat_round')
+
+
+def apply_round(db, mutations: List[Dict]) -> List[Dict]:
+    """
+    Apply every mutation of a combat round in one transaction
+
+    Each kind of mutation is one prepared statement run with executemany.
+    If any check fails (unknown character or ammo, ammo below zero), the
+    whole round is rolled back. The transaction goes through the helper,
+    so it uses the write queue when there is one and shows up in the query
+    metrics as 'combat_round'. When characters are sharded, the shards
+    involved are written in path order, each transaction held open until
+    the shards after it have committed. A round spanning several shards is
+    therefore not atomic at commit time: if an earlier shard's COMMIT
+    fails (e.g. disk full), the shards committed after it keep their part
+    of the round.
+
+    Args:
+        db: DatabaseHelper
+        mutations: List of mutations (see parse_round)
+
+    Returns:
+        New combat state of every character in the round (see combat_state)
+
+    Raises:
+        ValueError: If the round is malformed or breaks an invariant
+    """
+    statements = parse_round(mutations)
+    character_ids = sorted({row['character_id'] for rows in statements.values() for row in rows})
+    _apply_chain(_by_helper(db, character_ids), statements)
+    return combat_state(db, character_ids)
+
+
+def combat_state(db, character_ids: List[int]) -> List[Dict]:
+    """
+    Get what a combat round can change for several characters
+
+    Args:
+        db: DatabaseHelper
+        character_ids: Characters to look up
+
+    Returns:
+        One dict per existing character with hp, max_hp, ammo, active
+        status effects and unhealed critical injuries
+    """
+    state = {}
+    for helper, ids in _by_helper(db, character_ids):
+        marks = _placeholders(ids)
+        for row in helper.execute_query(
+                f"SELECT character_id, handle, hp, max_hp FROM characters WHERE character_id IN ({marks})", ids):
+            state[row['character_id']] = dict(row, ammo=[], status_effects=[], critical_injuries=[])
+        for key, query in (
+            ('ammo', f"SELECT ammo_id, character_id, ammo_type, quantity FROM ammo "
+                     f"WHERE character_id IN ({marks}) ORDER BY ammo_id"),
+            ('status_effects', f"SELECT effect_id, character_id, effect_name, effect_type, duration "
+                               f"FROM status_effects WHERE character_id IN ({marks}) AND active = 1 "
+                               f"ORDER BY effect_id"),
+            ('critical_injuries', f"SELECT injury_id, character_id, injury_name, description "
+                                  f"FROM critical_injuries WHERE character_id IN ({marks}) AND healed = 0 "
+                                  f"ORDER BY injury_id"),
+        ):
+            for row in helper.execute_query(query, ids):
+                if row['character_id'] in state:
+                    state[row['character_id']][key].append(row)
+    return [state[cid] for cid in sorted(state)]
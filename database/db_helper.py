@@ -4,26 +4,99 @@ Provides convenience functions for common database operations
 """
 
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Sequence, Tuple
+
+from metrics import MetricsRegistry, normalize_sql, registry
+from slow_queries import SlowQueryLog
 
 class DatabaseHelper:
     """Helper class for database operations"""
     
-    def __init__(self, db_path='cyberpunk_tracker.db'):
+    def __init__(self, db_path='cyberpunk_tracker.db', metrics: Optional[MetricsRegistry] = None,
+                 slow_query_threshold: Optional[float] = 0.1, slow_query_log_path: Optional[str] = None,
+                 shard_count: int = 0, attach: Optional[Dict[str, str]] = None,
+                 write_queue_window: Optional[float] = None):
         """
         Initialize the database helper
         
         Args:
             db_path: Path to the SQLite database file
+            metrics: Registry for query metrics (defaults to the shared registry)
+            slow_query_threshold: Seconds after which a query is logged with its
+                query plan (None disables the slow-query log)
+            slow_query_log_path: Optional file that slow queries are also written to
+            shard_count: Spread characters over this many shard files (0 or 1 disables sharding)
+            attach: Databases to ATTACH on every connection, as {schema name: path}
+            write_queue_window: Send writes through a group-commit queue that
+                batches writes arriving within this many seconds (None writes directly)
         """
         self.db_path = db_path
+        self.attach = attach or {}
+        self.slow_queries = SlowQueryLog(slow_query_threshold, log_path=slow_query_log_path)
+        self.metrics = metrics or registry
+        self._query_duration = self.metrics.histogram(
+            'cyberpunk_db_query_duration_seconds', 'Time spent executing SQL statements')
+        self._rows_returned = self.metrics.counter(
+            'cyberpunk_db_rows_returned_total', 'Rows returned by SELECT statements')
+        self._rows_affected = self.metrics.counter(
+            'cyberpunk_db_rows_affected_total', 'Rows changed by INSERT, UPDATE and DELETE statements')
+        self._connection_wait = self.metrics.histogram(
+            'cyberpunk_db_connection_wait_seconds', 'Time spent opening database connections')
+        self._query_errors = self.metrics.counter(
+            'cyberpunk_db_errors_total', 'SQL statements that raised an error')
+        self._slow_queries = self.metrics.counter(
+            'cyberpunk_db_slow_queries_total', 'Queries slower than the slow-query threshold')
+        self._full_scans = self.metrics.counter(
+            'cyberpunk_db_full_scans_total', 'Slow queries whose plan scans a full table')
+        
+        # Statements collected by batch(), per thread
+        self._local = threading.local()
+        self.write_queue_window = write_queue_window
+        self.write_queue = None
+        if write_queue_window is not None:
+            from write_queue import WriteQueue
+            self.write_queue = WriteQueue(self, window=write_queue_window)
+        
+        self.shards = None
+        if shard_count > 1:
+            from sharding import ShardRouter
+            self.shards = ShardRouter(self, shard_count)
+    
+    def connect(self) -> sqlite3.Connection:
+        """Open a new connection (caller closes it)"""
+        start = time.perf_counter()
+        conn = sqlite3.connect(self.db_path)
+        self._connection_wait.observe(time.perf_counter() - start)
+        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        # Off by default in SQLite; without it ON DELETE CASCADE does nothing
+        conn.execute("PRAGMA foreign_keys = ON")
+        for name, path in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+        return conn
+    
+    def connect_writer(self) -> sqlite3.Connection:
+        """
+        Open a connection for explicit write transactions (caller closes it)
+        
+        The connection is in autocommit mode, so the caller issues BEGIN
+        IMMEDIATE and COMMIT itself. It has no ATTACHed databases: BEGIN
+        IMMEDIATE locks every attached file, so shard writers would
+        otherwise serialize on the common file.
+        """
+        start = time.perf_counter()
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        self._connection_wait.observe(time.perf_counter() - start)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
     
     @contextmanager
     def get_connection(self):
         """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        conn = self.connect()
         try:
             yield conn
         finally:
@@ -40,10 +113,22 @@ class DatabaseHelper:
         Returns:
             List of dictionaries with query results
         """
+        statement = normalize_sql(query)
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            return [dict(row) for row in cursor.fetchall()]
+            start = time.perf_counter()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                rows = [dict(row) for row in cursor.fetchall()]
+            except sqlite3.Error as e:
+                self._query_errors.inc(statement=statement, error=type(e).__name__)
+                raise
+            duration = time.perf_counter() - start
+            self._query_duration.observe(duration, statement=statement)
+            self._rows_returned.inc(len(rows), statement=statement)
+            if self.slow_queries.is_slow(duration):
+                self._record_slow_query(conn, statement, query, params, duration)
+            return rows
     
     def execute_update(self, query: str, params: tuple = ()) -> int:
         """
@@ -55,13 +140,195 @@ class DatabaseHelper:
             
         Returns:
             Last row ID for INSERT, or number of affected rows
+            (0 inside batch(), where the statement only runs when the batch ends)
         """
+        pending = getattr(self._local, 'batch', None)
+        if pending is not None:
+            pending.append((query, tuple(params)))
+            return 0
+        
+        statement = normalize_sql(query)
+        if self.write_queue:
+            start = time.perf_counter()
+            try:
+                result = self.write_queue.execute([(query, params)])[0]
+            except sqlite3.Error as e:
+                self._query_errors.inc(statement=statement, error=type(e).__name__)
+                raise
+            self._query_duration.observe(time.perf_counter() - start, statement=statement)
+            return result
+        
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            conn.commit()
+            start = time.perf_counter()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                conn.commit()
+            except sqlite3.Error as e:
+                self._query_errors.inc(statement=statement, error=type(e).__name__)
+                raise
+            duration = time.perf_counter() - start
+            self._query_duration.observe(duration, statement=statement)
+            self._rows_affected.inc(max(cursor.rowcount, 0), statement=statement)
+            if self.slow_queries.is_slow(duration):
+                self._record_slow_query(conn, statement, query, params, duration)
             return cursor.lastrowid if query.strip().upper().startswith('INSERT') else cursor.rowcount
     
+    def execute_batch(self, statements: Sequence[Tuple[str, tuple]]) -> List[int]:
+        """
+        Execute several INSERT, UPDATE or DELETE statements in one transaction
+        
+        Goes through the write queue when one is configured, so the batch may
+        share its commit with other requests.
+        
+        Args:
+            statements: (query, params) pairs, applied in order, all or nothing
+            
+        Returns:
+            One result per statement, as execute_update would return
+        """
+        if not statements:
+            return []
+        if self.write_queue:
+            return self.write_queue.execute(statements)
+        
+        from write_queue import statement_result
+        with self.get_connection() as conn:
+            try:
+                results = []
+                for query, params in statements:
+                    cursor = conn.execute(query, params)
+                    results.append(statement_result(cursor, query))
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                self._query_errors.inc(statement='batch', error=type(e).__name__)
+                raise
+            return results
+    
+    @contextmanager
+    def batch(self):
+        """
+        Collect the writes made in this block and commit them together
+        
+        execute_update() (and the helpers built on it) only record their
+        statement while the block runs; everything is applied in one
+        transaction when the block exits. Reads inside the block still see
+        the database as it was before the block.
+        
+        Yields:
+            List of collected (query, params) pairs
+            
+        Raises:
+            RuntimeError: If called on a sharded database, whose character
+                writes are routed to shard helpers outside the batch (use
+                db.for_character(id).batch() instead)
+        """
+        if self.shards:
+            raise RuntimeError("batch() would miss writes routed to shards; "
+                               "use for_character(character_id).batch() instead")
+        if getattr(self._local, 'batch', None) is not None:
+            # Nested batch: join the outer one
+            yield self._local.batch
+            return
+        
+        self._local.batch = []
+        try:
+            yield self._local.batch
+            statements = self._local.batch
+        finally:
+            self._local.batch = None
+        self.execute_batch(statements)
+    
+    def transaction(self, work: Callable[[sqlite3.Connection], Any], statement: str) -> Any:
+        """
+        Run a function that writes and checks its writes in one transaction
+        
+        For writes that have to read what they changed before committing.
+        `work` gets a connection from connect_writer(), so it only sees this
+        file's tables. With a write queue, it runs on the writer thread in
+        its own SAVEPOINT and may share its commit with other requests.
+        
+        Args:
+            work: Called with the connection; raising rolls back its writes
+            statement: Label the transaction is timed and counted under
+            
+        Returns:
+            What `work` returned, once the transaction has committed
+        """
+        start = time.perf_counter()
+        try:
+            if self.write_queue:
+                result = self.write_queue.run(work)
+            else:
+                conn = self.connect_writer()
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    result = work(conn)
+                    conn.execute("COMMIT")
+                finally:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    conn.close()
+        except sqlite3.Error as e:
+            self.record_error(statement, e)
+            raise
+        self._query_duration.observe(time.perf_counter() - start, statement=statement)
+        return result
+    
+    def record_error(self, statement: str, error: BaseException):
+        """Count a failed statement (for writers that don't go through execute_update)"""
+        self._query_errors.inc(statement=statement, error=type(error).__name__)
+    
+    def record_rows(self, statement: str, rows: int):
+        """Count changed rows (for writers that don't go through execute_update)"""
+        self._rows_affected.inc(rows, statement=statement)
+    
+    def _record_slow_query(self, conn, statement: str, query: str, params, duration: float):
+        """Capture EXPLAIN QUERY PLAN for a slow query and add it to the slow-query log"""
+        try:
+            plan = [dict(row) for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        except sqlite3.Error:
+            plan = []
+        entry = self.slow_queries.record(statement, query, params, duration, plan)
+        self._slow_queries.inc(statement=statement)
+        if entry['full_scans']:
+            self._full_scans.inc(statement=statement)
+    
+    # ==================== Shard Routing ====================
+    
+    def for_character(self, character_id: int) -> 'DatabaseHelper':
+        """Get the helper for the database holding a character (self when not sharded)"""
+        return self.shards.for_character(character_id) if self.shards else self
+    
+    def for_user(self, user_id: int) -> 'DatabaseHelper':
+        """Get the helper for the database holding a user's characters (self when not sharded)"""
+        return self.shards.for_user(user_id) if self.shards else self
+    
+    def character_helpers(self) -> List['DatabaseHelper']:
+        """Get the helpers holding character rows: every shard, or self when not sharded"""
+        return list(self.shards.shards) if self.shards else [self]
+    
+    def databases(self) -> List['DatabaseHelper']:
+        """Get a helper for every database file: self, then each shard"""
+        return [self] + self.shards.shards if self.shards else [self]
+    
+    def fan_out(self, query: str, params: tuple = (), sort_key=None) -> List[Dict]:
+        """
+        Run a character query on every shard and merge the results
+        
+        Args:
+            query: SQL query string
+            params: Query parameters
+            sort_key: Key function matching the query's ORDER BY, used to merge
+            
+        Returns:
+            List of dictionaries with query results
+        """
+        if self.shards:
+            return self.shards.fan_out(query, params, sort_key)
+        return self.execute_query(query, params)
+    
     # ==================== User Operations ====================
     
     def create_user(self, username: str, password_hash: str) -> int:
@@ -81,10 +348,47 @@ class DatabaseHelper:
         results = self.execute_query(query, (username,))
         return results[0] if results else None
     
+    def delete_user(self, user_id: int) -> Optional[Dict[str, int]]:
+        """
+        Delete a user and all their characters in one transaction
+        
+        Characters and their child rows go through ON DELETE CASCADE, which
+        uses the foreign-key indexes, so the cost grows with the user's rows
+        rather than with the size of the tables.
+        
+        Args:
+            user_id: User to delete
+            
+        Returns:
+            Dictionary with the number of characters deleted and the total
+            number of rows deleted (cascades included), or None if the user
+            doesn't exist
+        """
+        if self.shards:
+            return self.shards.delete_user(user_id)
+        
+        def work(conn):
+            # The transaction holds the write lock, so the counts match what is deleted
+            characters = conn.execute(
+                "SELECT COUNT(*) FROM characters WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+            changes = conn.total_changes
+            if not conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,)).rowcount:
+                return None
+            return {'characters_deleted': characters, 'rows_deleted': conn.total_changes - changes}
+        
+        result = self.transaction(work, 'delete_user')
+        if result:
+            self.record_rows('delete_user', result['rows_deleted'])
+        return result
+    
     # ==================== Character Operations ====================
     
     def create_character(self, user_id: int, handle: str, **kwargs) -> int:
         """Create a new character"""
+        if self.shards:
+            return self.shards.create_character(user_id, handle, **kwargs)
+        
         fields = ['user_id', 'handle']
         values = [user_id, handle]
         
@@ -100,17 +404,19 @@ class DatabaseHelper:
     
     def get_character(self, character_id: int) -> Optional[Dict]:
         """Get character by ID"""
+        db = self.for_character(character_id)
         query = "SELECT * FROM characters WHERE character_id = ?"
-        results = self.execute_query(query, (character_id,))
+        results = db.execute_query(query, (character_id,))
         return results[0] if results else None
     
     def get_user_characters(self, user_id: int) -> List[Dict]:
         """Get all characters for a user"""
         query = "SELECT * FROM characters WHERE user_id = ? ORDER BY created_date DESC"
-        return self.execute_query(query, (user_id,))
+        return self.for_user(user_id).execute_query(query, (user_id,))
     
     def update_character(self, character_id: int, **kwargs) -> int:
         """Update character fields"""
+        db = self.for_character(character_id)
         if not kwargs:
             return 0
         
@@ -118,17 +424,19 @@ class DatabaseHelper:
         values = list(kwargs.values()) + [character_id]
         
         query = f"UPDATE characters SET {set_clause}, last_modified = CURRENT_TIMESTAMP WHERE character_id = ?"
-        return self.execute_update(query, tuple(values))
+        return db.execute_update(query, tuple(values))
     
     # ==================== Inventory Operations ====================
     
     def add_item_to_inventory(self, character_id: int, item_id: int, quantity: int = 1) -> int:
         """Add an item to character's inventory"""
+        db = self.for_character(character_id)
         query = "INSERT INTO inventory (character_id, item_id, quantity) VALUES (?, ?, ?)"
-        return self.execute_update(query, (character_id, item_id, quantity))
+        return db.execute_update(query, (character_id, item_id, quantity))
     
     def get_character_inventory(self, character_id: int) -> List[Dict]:
         """Get all items in character's inventory"""
+        db = self.for_character(character_id)
         query = """
             SELECT i.*, inv.quantity, inv.equipped, inv.notes as inv_notes
             FROM inventory inv
@@ -136,26 +444,28 @@ class DatabaseHelper:
             WHERE inv.character_id = ?
             ORDER BY i.item_type, i.item_name
         """
-        return self.execute_query(query, (character_id,))
+        return db.execute_query(query, (character_id,))
     
     def update_inventory_quantity(self, character_id: int, item_id: int, quantity: int) -> int:
         """Update quantity of an item in inventory"""
+        db = self.for_character(character_id)
         query = "UPDATE inventory SET quantity = ? WHERE character_id = ? AND item_id = ?"
-        return self.execute_update(query, (quantity, character_id, item_id))
+        return db.execute_update(query, (quantity, character_id, item_id))
     
     # ==================== Stats Operations ====================
     
     def set_character_stats(self, character_id: int, **stats) -> int:
         """Set character stats (creates or updates)"""
+        db = self.for_character(character_id)
         # Check if stats exist
-        existing = self.execute_query("SELECT stat_id FROM stats WHERE character_id = ?", (character_id,))
+        existing = db.execute_query("SELECT stat_id FROM stats WHERE character_id = ?", (character_id,))
         
         if existing:
             # Update existing stats
             set_clause = ', '.join([f"{key} = ?" for key in stats.keys()])
             values = list(stats.values()) + [character_id]
             query = f"UPDATE stats SET {set_clause} WHERE character_id = ?"
-            return self.execute_update(query, tuple(values))
+            return db.execute_update(query, tuple(values))
         else:
             # Create new stats
             fields = ['character_id'] + list(stats.keys())
@@ -163,18 +473,20 @@ class DatabaseHelper:
             placeholders = ', '.join(['?'] * len(values))
             field_names = ', '.join(fields)
             query = f"INSERT INTO stats ({field_names}) VALUES ({placeholders})"
-            return self.execute_update(query, tuple(values))
+            return db.execute_update(query, tuple(values))
     
     def get_character_stats(self, character_id: int) -> Optional[Dict]:
         """Get character stats"""
+        db = self.for_character(character_id)
         query = "SELECT * FROM stats WHERE character_id = ?"
-        results = self.execute_query(query, (character_id,))
+        results = db.execute_query(query, (character_id,))
         return results[0] if results else None
     
     # ==================== Contacts Operations ====================
     
     def add_contact(self, character_id: int, contact_type: str, name: str, **kwargs) -> int:
         """Add a contact (friend, love, enemy, or other)"""
+        db = self.for_character(character_id)
         fields = ['character_id', 'contact_type', 'name']
         values = [character_id, contact_type, name]
         
@@ -186,22 +498,24 @@ class DatabaseHelper:
         field_names = ', '.join(fields)
         
         query = f"INSERT INTO contacts ({field_names}) VALUES ({placeholders})"
-        return self.execute_update(query, tuple(values))
+        return db.execute_update(query, tuple(values))
     
     def get_character_contacts(self, character_id: int, contact_type: Optional[str] = None) -> List[Dict]:
         """Get character's contacts, optionally filtered by type"""
+        db = self.for_character(character_id)
         if contact_type:
             query = "SELECT * FROM contacts WHERE character_id = ? AND contact_type = ? ORDER BY contact_number"
-            return self.execute_query(query, (character_id, contact_type))
+            return db.execute_query(query, (character_id, contact_type))
         else:
             query = "SELECT * FROM contacts WHERE character_id = ? ORDER BY contact_type, contact_number"
-            return self.execute_query(query, (character_id,))
+            return db.execute_query(query, (character_id,))
     
     # ==================== Cybernetics Operations ====================
     
     def add_cybernetic(self, character_id: int, name: str, body_location: str, 
                       humanity_cost: int = 0, **kwargs) -> int:
         """Add a cybernetic implant"""
+        db = self.for_character(character_id)
         fields = ['character_id', 'cybernetic_name', 'body_location', 'humanity_cost']
         values = [character_id, name, body_location, humanity_cost]
         
@@ -213,20 +527,36 @@ class DatabaseHelper:
         field_names = ', '.join(fields)
         
         query = f"INSERT INTO cybernetics ({field_names}) VALUES ({placeholders})"
-        return self.execute_update(query, tuple(values))
+        return db.execute_update(query, tuple(values))
     
     def get_character_cybernetics(self, character_id: int) -> List[Dict]:
         """Get all cybernetics for a character"""
+        db = self.for_character(character_id)
         query = "SELECT * FROM cybernetics WHERE character_id = ? ORDER BY installed_date"
-        return self.execute_query(query, (character_id,))
+        return db.execute_query(query, (character_id,))
     
+    # ==================== Map Operations ====================
+
+    def get_map(self, map_id: int) -> Optional[Dict]:
+        """Get map by ID"""
+        query = "SELECT * FROM maps WHERE map_id = ?"
+        results = self.execute_query(query, (map_id,))
+        return results[0] if results else None
+
     # ==================== Utility Functions ====================
     
     def delete_character(self, character_id: int) -> int:
-        """Delete a character (cascades to related tables)"""
+        """Delete a character (cascades to related tables, see connect())"""
+        if self.shards:
+            return self.shards.delete_character(character_id)
         query = "DELETE FROM characters WHERE character_id = ?"
         return self.execute_update(query, (character_id,))
     
+    def optimize(self):
+        """Let SQLite refresh query planner statistics where they are stale (cheap if nothing changed)"""
+        with self.get_connection() as conn:
+            conn.execute("PRAGMA optimize")
+    
     def get_table_count(self, table_name: str) -> int:
         """Get the number of rows in a table"""
         query = f"SELECT COUNT(*) as count FROM {table_name}"
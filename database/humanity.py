@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Humanity recomputation for Cyberpunk Tracker
+Keeps characters.humanity in line with the humanity cost of installed cybernetics
+"""
+
+import os
+import sqlite3
+import time
+from typing import Dict, List
+
+# Humanity a character should have: max_humanity minus the cost of its
+# cybernetics, never below 0. Characters without max_humanity are left
+# alone, because there is no baseline to subtract from.
+EXPECTED_HUMANITY = """
+    SELECT ch.character_id,
+           MAX(ch.max_humanity - COALESCE(SUM(cy.humanity_cost), 0), 0) AS humanity
+    FROM characters ch
+    LEFT JOIN cybernetics cy ON cy.character_id = ch.character_id
+    WHERE ch.max_humanity > 0
+    GROUP BY ch.character_id
+"""
+
+RECOMPUTE_SQL = f"""
+    UPDATE characters
+    SET humanity = expected.humanity
+    FROM ({EXPECTED_HUMANITY}) AS expected
+    WHERE characters.character_id = expected.character_id
+      AND characters.humanity IS NOT expected.humanity
+"""
+
+DIFF_SQL = f"""
+    SELECT ch.character_id, ch.handle, ch.humanity AS stored, expected.humanity AS expected
+    FROM characters ch
+    JOIN ({EXPECTED_HUMANITY}) AS expected ON expected.character_id = ch.character_id
+    WHERE ch.humanity IS NOT expected.humanity
+    ORDER BY ch.character_id
+"""
+
+# Per-character form of EXPECTED_HUMANITY, used by the triggers
+_RECOMPUTE_ONE = """
+        UPDATE characters
+        SET humanity = MAX(max_humanity - (
+            SELECT COALESCE(SUM(humanity_cost), 0) FROM cybernetics WHERE character_id = {ref}.character_id
+        ), 0)
+        WHERE character_id = {ref}.character_id AND max_humanity > 0;"""
+
+# Trigger name -> (event, body)
+TRIGGERS = {
+    'trg_humanity_cybernetic_insert':
+        ("AFTER INSERT ON cybernetics", _RECOMPUTE_ONE.format(ref='NEW')),
+    'trg_humanity_cybernetic_delete':
+        ("AFTER DELETE ON cybernetics", _RECOMPUTE_ONE.format(ref='OLD')),
+    'trg_humanity_cybernetic_update':
+        ("AFTER UPDATE OF humanity_cost, character_id ON cybernetics",
+         _RECOMPUTE_ONE.format(ref='OLD') + _RECOMPUTE_ONE.format(ref='NEW')),
+    'trg_humanity_max_update':
+        ("AFTER UPDATE OF max_humanity ON characters", _RECOMPUTE_ONE.format(ref='NEW')),
+}
+
+
+def humanity_diff(db) -> List[Dict]:
+    """
+    List characters whose stored humanity doesn't match their cybernetics
+
+    Args:
+        db: DatabaseHelper
+
+    Returns:
+        One row per mismatch with character_id, handle, stored and expected humanity
+    """
+    if db.shards:
+        return db.fan_out(DIFF_SQL, sort_key=lambda row: row['character_id'])
+    return db.execute_query(DIFF_SQL)
+
+
+def recompute_humanity(db, dry_run: bool = False) -> Dict:
+    """
+    Recompute humanity for every character with one set-based UPDATE
+
+    The cybernetics costs are aggregated once with GROUP BY and joined back
+    with UPDATE ... FROM, so SQLite does a single pass instead of one query
+    per character. Only rows whose value changes are written.
+
+    Args:
+        db: DatabaseHelper
+        dry_run: Only report what would change
+
+    Returns:
+        Dictionary with the number of characters updated and, for a dry
+        run, the list of differences
+    """
+    if dry_run:
+        changes = humanity_diff(db)
+        return {'updated': 0, 'would_update': len(changes), 'changes': changes}
+    return {'updated': sum(helper.execute_update(RECOMPUTE_SQL) for helper in db.character_helpers())}
+
+
+def install_triggers(db):
+    """
+    Keep humanity up to date incrementally
+
+    Inserting, deleting or re-costing a cybernetic, or changing a
+    character's max_humanity, recomputes that one character's humanity in
+    the same transaction. Run recompute_humanity() once after installing to
+    fix rows that drifted before.
+    """
+    for helper in db.character_helpers():
+        with helper.get_connection() as conn:
+            for name, (event, body) in TRIGGERS.items():
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+                conn.execute(f"CREATE TRIGGER {name} {event} BEGIN{body}\n    END")
+            conn.commit()
+
+
+def remove_triggers(db):
+    """Stop incremental humanity updates"""
+    for helper in db.character_helpers():
+        with helper.get_connection() as conn:
+            for name in TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            conn.commit()
+
+
+def triggers_installed(db) -> bool:
+    """Check whether the incremental triggers are installed"""
+    rows = db.character_helpers()[0].execute_query(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_humanity_%'"
+    )
+    return {row['name'] for row in rows} == set(TRIGGERS)
+
+
+# ==================== Benchmark ====================
+
+def _generate(db_path: str, characters: int, cybernetics: int):
+    """Create a database with random characters and cybernetics"""
+    from init_db import init_database
+    init_database(db_path, verbose=False)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users (username, password_hash) VALUES ('bench', 'x')")
+    conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {characters})
+        INSERT INTO characters (user_id, handle, humanity, max_humanity)
+        SELECT 1, 'Runner ' || i, 50, 50 FROM n
+    """)
+    conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {cybernetics})
+        INSERT INTO cybernetics (character_id, cybernetic_name, humanity_cost)
+        SELECT abs(random()) % {characters} + 1, 'Implant ' || i, abs(random()) % 8 FROM n
+    """)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def _reset(db_path: str):
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE characters SET humanity = 50")
+    conn.commit()
+    conn.close()
+
+
+def _python_loop(db_path: str) -> int:
+    """The row-by-row approach the set-based UPDATE replaces"""
+    conn = sqlite3.connect(db_path)
+    updated = 0
+    for character_id, max_humanity, humanity in conn.execute(
+            "SELECT character_id, max_humanity, humanity FROM characters WHERE max_humanity > 0").fetchall():
+        cost = conn.execute("SELECT COALESCE(SUM(humanity_cost), 0) FROM cybernetics WHERE character_id = ?",
+                            (character_id,)).fetchone()[0]
+        expected = max(max_humanity - cost, 0)
+        if expected != humanity:
+            conn.execute("UPDATE characters SET humanity = ? WHERE character_id = ?", (expected, character_id))
+            updated += 1
+    conn.commit()
+    conn.close()
+    return updated
+
+
+def benchmark(db_path: str, characters: int = 100_000, cybernetics: int = 1_000_000,
+              inserts: int = 10_000) -> Dict[str, float]:
+    """
+    Time the set-based recompute against a Python loop, and the trigger cost
+
+    Args:
+        db_path: Scratch database file (overwritten)
+        characters: Number of characters to generate
+        cybernetics: Number of cybernetics rows to generate
+        inserts: Cybernetics inserted to measure trigger overhead
+
+    Returns:
+        Timings in seconds and the number of rows updated
+    """
+    from db_helper import DatabaseHelper
+    from metrics import MetricsRegistry
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    start = time.perf_counter()
+    _generate(db_path, characters, cybernetics)
+    results = {'generate_s': time.perf_counter() - start}
+
+    db = DatabaseHelper(db_path, metrics=MetricsRegistry(), slow_query_threshold=None)
+
+    start = time.perf_counter()
+    results['diff_rows'] = len(humanity_diff(db))
+    results['dry_run_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results['updated'] = recompute_humanity(db)['updated']
+    results['set_based_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recompute_humanity(db)
+    results['set_based_noop_s'] = time.perf_counter() - start
+
+    _reset(db_path)
+    start = time.perf_counter()
+    _python_loop(db_path)
+    results['python_loop_s'] = time.perf_counter() - start
+
+    def insert_batch() -> float:
+        conn = sqlite3.connect(db_path)
+        start = time.perf_counter()
+        conn.executemany(
+            "INSERT INTO cybernetics (character_id, cybernetic_name, humanity_cost) VALUES (?, 'Bench', 1)",
+            [(i % characters + 1,) for i in range(inserts)]
+        )
+        conn.commit()
+        conn.close()
+        return time.perf_counter() - start
+
+    results['inserts_plain_s'] = insert_batch()
+    install_triggers(db)
+    results['inserts_triggers_s'] = insert_batch()
+    remove_triggers(db)
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    from db_helper import DatabaseHelper
+
+    usage = """Usage:
+  python3 humanity.py diff [db_path]                Show characters whose humanity is out of date
+  python3 humanity.py recompute [db_path]           Fix humanity for every character
+  python3 humanity.py triggers on|off [db_path]     Keep humanity updated on every cybernetics change
+  python3 humanity.py bench [scratch_db] [rows]     Benchmark at 1M cybernetics rows"""
+
+    if len(sys.argv) < 2:
+        print(usage)
+        sys.exit(1)
+
+    command, args = sys.argv[1], sys.argv[2:]
+
+    if command == 'bench':
+        scratch = args[0] if args else 'humanity_bench.db'
+        rows = int(args[1]) if len(args) > 1 else 1_000_000
+        print("Cyberpunk Tracker - Humanity Recompute Benchmark")
+        print("=" * 50)
+        results = benchmark(scratch, characters=max(rows // 10, 1), cybernetics=rows)
+        print(f"{rows:,} cybernetics, {max(rows // 10, 1):,} characters "
+              f"(generated in {results['generate_s']:.1f} s)")
+        print(f"  Dry-run diff:                  {results['dry_run_s'] * 1000:6.0f} ms ({results['diff_rows']:,} rows)")
+        print(f"  Set-based UPDATE:              {results['set_based_s'] * 1000:6.0f} ms ({results['updated']:,} updated)")
+        print(f"  Set-based, nothing to update:  {results['set_based_noop_s'] * 1000:6.0f} ms")
+        print(f"  Python loop:                   {results['python_loop_s'] * 1000:6.0f} ms")
+        print(f"  10,000 inserts, no triggers:   {results['inserts_plain_s'] * 1000:6.0f} ms")
+        print(f"  10,000 inserts, with triggers: {results['inserts_triggers_s'] * 1000:6.0f} ms")
+        os.remove(scratch)
+        sys.exit(0)
+
+    if command == 'triggers':
+        if not args or args[0] not in ('on', 'off'):
+            print(usage)
+            sys.exit(1)
+        db_path = args[1] if len(args) > 1 else 'cyberpunk_tracker.db'
+    else:
+        db_path = args[0] if args else 'cyberpunk_tracker.db'
+
+    shard_count = int(os.environ.get('CYBERPUNK_SHARDS', '0'))
+    db = DatabaseHelper(db_path, shard_count=shard_count)
+
+    if command == 'diff':
+        changes = humanity_diff(db)
+        for row in changes:
+            print(f"  {row['character_id']:>6}  {row['handle']:<24} {row['stored']:>4} -> {row['expected']}")
+        print(f"✓ {len(changes)} characters out of date")
+    elif command == 'recompute':
+        print(f"✓ Updated humanity for {recompute_humanity(db)['updated']} characters")
+    elif command == 'triggers' and args[0] == 'on':
+        if triggers_installed(db):
+            print("✓ Humanity triggers already installed")
+        else:
+            install_triggers(db)
+            print(f"✓ Humanity triggers installed ({recompute_humanity(db)['updated']} characters fixed)")
+    elif command == 'triggers':
+        if not triggers_installed(db):
+            print("✓ Humanity triggers not installed")
+        else:
+            remove_triggers(db)
+            print("✓ Humanity triggers removed")
+    else:
+        print(usage)
+        sys.exit(1)
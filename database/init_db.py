@@ -4,26 +4,209 @@ Database initialization script for Cyberpunk Tracker
 Creates the SQLite database and sets up all tables
 """
 
+import hashlib
+import re
 import sqlite3
 import os
 
-def init_database(db_path='cyberpunk_tracker.db'):
+# Get the directory where this script is located
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_PATH = os.path.join(SCRIPT_DIR, 'schema.sql')
+
+# Tables that live only in the main (common) database when sharding is on.
+# Shards attach the common database, so unqualified names still resolve.
+SHARED_TABLES = ('users', 'items', 'maps', 'character_directory', 'user_shards', 'shard_layout')
+
+_schema_cache = {}
+
+def shard_schema(schema_sql):
+    """
+    Derive the schema for a shard file from schema.sql
+    
+    Shared tables are left out, and so are foreign keys that point at them,
+    because SQLite cannot enforce foreign keys across attached databases.
+    
+    Args:
+        schema_sql: Contents of schema.sql
+        
+    Returns:
+        Schema SQL for a shard
+    """
+    shared = '|'.join(SHARED_TABLES)
+    statements = []
+    for statement in schema_sql.split(';'):
+        if re.search(rf'CREATE TABLE IF NOT EXISTS ({shared})\s*\(', statement):
+            continue
+        if re.search(rf'CREATE (UNIQUE )?INDEX IF NOT EXISTS \w+ ON ({shared})\s*\(', statement):
+            continue
+        statement = re.sub(rf',\s*FOREIGN KEY \([^)]*\) REFERENCES ({shared})\([^)]*\)[^,\n]*', '', statement)
+        statements.append(statement)
+    return ';'.join(statements)
+
+def read_schema(shard=False):
+    """
+    Read schema.sql and its fingerprint (cached until the file changes)
+    
+    Args:
+        shard: Return the shard variant of the schema
+    
+    Returns:
+        Tuple of (schema SQL, SHA-256 fingerprint)
+    """
+    mtime = os.stat(SCHEMA_PATH).st_mtime_ns
+    cached = _schema_cache.get((mtime, shard))
+    if cached is None:
+        with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+            schema_sql = f.read()
+        if shard:
+            schema_sql = shard_schema(schema_sql)
+        cached = (schema_sql, hashlib.sha256(schema_sql.encode('utf-8')).hexdigest())
+        _schema_cache[(mtime, shard)] = cached
+    return cached
+
+def get_stored_fingerprint(conn):
+    """Get the schema fingerprint stored in a database, or None"""
+    try:
+        row = conn.execute("SELECT fingerprint FROM schema_info WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        # schema_info missing: database is empty or predates fingerprints
+        return None
+    return row[0] if row else None
+
+def verify_schema(db_path='cyberpunk_tracker.db', shard=False):
+    """
+    Check that a database was initialized from the current schema.sql
+    
+    This is a single row lookup, so it is cheap enough to run on every startup.
+    
+    Args:
+        db_path: Path to the database file
+        shard: Check against the shard variant of the schema
+        
+    Returns:
+        True if the stored fingerprint matches schema.sql
+    """
+    if not os.path.exists(db_path):
+        return False
+    _, fingerprint = read_schema(shard)
+    conn = sqlite3.connect(db_path)
+    try:
+        return get_stored_fingerprint(conn) == fingerprint
+    finally:
+        conn.close()
+
+def column_definitions(create_sql):
+    """
+    Split a CREATE TABLE statement into its column definitions
+    
+    Args:
+        create_sql: CREATE TABLE statement, as stored in sqlite_master
+        
+    Returns:
+        Dictionary of column name -> column definition, in declaration order
+    """
+    body = re.sub(r'--[^\n]*', '', create_sql)
+    body = body[body.index('(') + 1:body.rindex(')')]
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(body):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(body[start:i])
+            start = i + 1
+    parts.append(body[start:])
+    
+    columns = {}
+    for part in parts:
+        definition = ' '.join(part.split())
+        if definition and not re.match(r'(CONSTRAINT|PRIMARY KEY|UNIQUE|CHECK|FOREIGN KEY)\b', definition, re.I):
+            columns[definition.split()[0].strip('"`[]')] = definition
+    return columns
+
+def migrate_columns(conn, schema_sql):
+    """
+    Add columns that schema.sql declares but an existing table lacks
+    
+    CREATE TABLE IF NOT EXISTS leaves existing tables as they are, so
+    columns added to schema.sql after a database was created are added
+    here with ALTER TABLE. Changes ALTER TABLE can't make are reported
+    instead of being skipped.
+    
+    Args:
+        conn: Connection to the database, after schema.sql has been applied
+        schema_sql: Schema the database should match
+        
+    Returns:
+        List of 'table.column' names that were added
+        
+    Raises:
+        ValueError: If a table has columns schema.sql doesn't declare, or a
+            missing column can't be added (e.g. NOT NULL without a default)
+    """
+    expected = sqlite3.connect(':memory:')
+    try:
+        expected.executescript(schema_sql)
+        tables = expected.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+    finally:
+        expected.close()
+    
+    added = []
+    for table, create_sql in tables:
+        existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        wanted = column_definitions(create_sql)
+        extra = [column for column in existing if column not in wanted]
+        if extra:
+            raise ValueError(f"{table} has columns that schema.sql doesn't declare: {', '.join(extra)}")
+        for column, definition in wanted.items():
+            if column in existing:
+                continue
+            try:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {definition}")
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"Cannot add {table}.{column} to the existing table: {e}")
+            added.append(f"{table}.{column}")
+    return added
+
+def ensure_schema(db_path='cyberpunk_tracker.db', shard=False):
+    """
+    Initialize the database only if its schema is missing or outdated
+    
+    Args:
+        db_path: Path to the database file
+        shard: Use the shard variant of the schema
+        
+    Returns:
+        True if the database is ready to use
+    """
+    if verify_schema(db_path, shard):
+        return True
+    return init_database(db_path, verbose=False, shard=shard)
+
+def init_database(db_path='cyberpunk_tracker.db', verbose=True, shard=False):
     """
     Initialize the database by executing the schema.sql file
     
+    The schema is skipped when the database already carries the fingerprint
+    of the current schema.sql. Otherwise it is executed (all statements are
+    CREATE ... IF NOT EXISTS, so existing data is kept), columns missing
+    from existing tables are added (see migrate_columns()) and the new
+    fingerprint is stored. If the tables can't be brought up to date, the
+    fingerprint is left as it was and False is returned.
+    
     Args:
         db_path: Path where the database file will be created
+        verbose: Print progress and the list of tables
+        shard: Create a shard file (see shard_schema())
     """
-    # Get the directory where this script is located
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    schema_path = os.path.join(script_dir, 'schema.sql')
-    
     # Read the schema file
     try:
-        with open(schema_path, 'r', encoding='utf-8') as f:
-            schema_sql = f.read()
+        schema_sql, fingerprint = read_schema(shard)
     except FileNotFoundError:
-        print(f"Error: Could not find schema.sql at {schema_path}")
+        print(f"Error: Could not find schema.sql at {SCHEMA_PATH}")
         return False
     
     # Create/connect to database
@@ -31,19 +214,39 @@ def init_database(db_path='cyberpunk_tracker.db'):
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
+        if get_stored_fingerprint(conn) == fingerprint:
+            conn.close()
+            if verbose:
+                print(f"✓ Database at {db_path} is already up to date")
+            return True
+        
         # Execute the schema
         cursor.executescript(schema_sql)
+        try:
+            added = migrate_columns(conn, schema_sql)
+        except ValueError as e:
+            conn.close()
+            print(f"Error updating database at {db_path}: {e}")
+            return False
+        cursor.execute(
+            "INSERT OR REPLACE INTO schema_info (id, fingerprint, applied_at) VALUES (1, ?, CURRENT_TIMESTAMP)",
+            (fingerprint,)
+        )
         
         conn.commit()
-        print(f"✓ Database created successfully at: {db_path}")
-        print(f"✓ All tables initialized")
         
-        # Show created tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-        tables = cursor.fetchall()
-        print(f"\nCreated tables ({len(tables)}):")
-        for table in tables:
-            print(f"  - {table[0]}")
+        if verbose:
+            print(f"✓ Database created successfully at: {db_path}")
+            print(f"✓ All tables initialized")
+            for column in added:
+                print(f"✓ Added column {column}")
+            
+            # Show created tables
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
+            tables = cursor.fetchall()
+            print(f"\nCreated tables ({len(tables)}):")
+            for table in tables:
+                print(f"  - {table[0]}")
         
         conn.close()
         return True
@@ -70,6 +273,37 @@ def reset_database(db_path='cyberpunk_tracker.db'):
     
     return init_database(db_path)
 
+def restore_database(backup_path, db_path='cyberpunk_tracker.db'):
+    """
+    Restore the database from a backup snapshot
+    
+    The current database is snapshotted first, and the restored database
+    is brought up to the current schema.
+    
+    Args:
+        backup_path: Snapshot file to restore
+        db_path: Path to the database file
+    """
+    from backup import BackupManager
+    
+    # With shards, the shard snapshots taken with this one are restored too
+    shard_count = int(os.environ.get('CYBERPUNK_SHARDS', '0'))
+    if shard_count > 1:
+        from sharding import shard_path
+        manager = BackupManager(db_path, shard_paths=[shard_path(db_path, i) for i in range(shard_count)])
+    else:
+        manager = BackupManager(db_path)
+    try:
+        safety_path = manager.restore(backup_path)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Error restoring database: {e}")
+        return False
+    
+    print(f"✓ Restored {db_path} from {backup_path}")
+    if safety_path:
+        print(f"✓ Previous database saved as {safety_path}")
+    return init_database(db_path)
+
 if __name__ == '__main__':
     import sys
     
@@ -80,6 +314,12 @@ if __name__ == '__main__':
     if len(sys.argv) > 1:
         if sys.argv[1] == '--reset':
             reset_database()
+        elif sys.argv[1] == '--restore':
+            if len(sys.argv) < 3:
+                print("Usage: python3 init_db.py --restore <backup_file> [db_path]")
+                sys.exit(1)
+            db_path = sys.argv[3] if len(sys.argv) > 3 else 'cyberpunk_tracker.db'
+            restore_database(sys.argv[2], db_path)
         else:
             db_path = sys.argv[1]
             init_database(db_path)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Scheduled maintenance jobs for Cyberpunk Tracker
+Runs backups, archival and orphan sweeps periodically in background threads
+"""
+
+import logging
+import os
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """
+    Calls a function every `interval` seconds in a daemon thread
+
+    A failed run is logged and the job carries on with the next one, so a
+    locked database or a full disk doesn't stop the schedule for good.
+    """
+
+    def __init__(self, name: str, run: Callable[[], object], interval: float):
+        """
+        Initialize the job
+
+        Args:
+            name: Job name, used for the thread and in log messages
+            run: Function called on every run
+            interval: Seconds between runs
+        """
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except Exception:
+                logger.exception("Scheduled %s failed", self.name)
+
+    def start(self):
+        """Start running the job (does nothing if it is already running)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=f'cyberpunk-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the job, waiting for a run in progress to finish"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+def scheduled_jobs(db) -> List[PeriodicJob]:
+    """
+    Build the jobs configured by environment variables
+
+    CYBERPUNK_BACKUP_INTERVAL, CYBERPUNK_ARCHIVE_INTERVAL and
+    CYBERPUNK_ORPHAN_SWEEP_INTERVAL set the seconds between runs; jobs
+    whose interval is unset or 0 are left out. CYBERPUNK_BACKUP_KEEP sets
+    how many snapshots are kept.
+
+    Args:
+        db: DatabaseHelper the jobs work on
+
+    Returns:
+        Jobs, not started yet
+    """
+    jobs = []
+
+    backup_interval = float(os.environ.get('CYBERPUNK_BACKUP_INTERVAL', '0'))
+    if backup_interval > 0:
+        from backup import BackupManager
+        # Character data lives in the shard files when sharded, so each run snapshots them too
+        backups = BackupManager(db.db_path, keep=int(os.environ.get('CYBERPUNK_BACKUP_KEEP', '7')),
+                                shard_paths=db.shards.paths if db.shards else ())
+        jobs.append(PeriodicJob('backup', backups.snapshot, backup_interval))
+
+    archive_interval = float(os.environ.get('CYBERPUNK_ARCHIVE_INTERVAL', '0'))
+    if archive_interval > 0:
+        from archive import Archiver
+        jobs.append(PeriodicJob('archive', Archiver(db).archive, archive_interval))
+
+    orphan_sweep_interval = float(os.environ.get('CYBERPUNK_ORPHAN_SWEEP_INTERVAL', '0'))
+    if orphan_sweep_interval > 0:
+        from orphans import OrphanSweeper
+        jobs.append(PeriodicJob('orphan-sweep', OrphanSweeper(db).sweep, orphan_sweep_interval))
+
+    return jobs
+
+
+if __name__ == '__main__':
+    import sys
+    from db_helper import DatabaseHelper
+
+    usage = """Usage:
+  python3 jobs.py [db_path]    Run the scheduled jobs until interrupted
+
+Jobs are configured with CYBERPUNK_BACKUP_INTERVAL, CYBERPUNK_ARCHIVE_INTERVAL
+and CYBERPUNK_ORPHAN_SWEEP_INTERVAL (seconds between runs)."""
+
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1].startswith('-')):
+        print(usage)
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'cyberpunk_tracker.db'
+    shard_count = int(os.environ.get('CYBERPUNK_SHARDS', '0'))
+    jobs = scheduled_jobs(DatabaseHelper(db_path, shard_count=shard_count))
+    if not jobs:
+        print(usage)
+        sys.exit(1)
+
+    for job in jobs:
+        job.start()
+        print(f"✓ {job.name} every {job.interval:g} s")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for job in jobs:
+            job.stop()
+        print("✓ Jobs stopped")
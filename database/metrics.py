@@ -0,0 +1,211 @@
+"""
+Lightweight metrics for Cyberpunk Tracker
+Counters and latency histograms rendered in Prometheus text format
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# Latency buckets in seconds (0.1 ms .. 5 s)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelKey = Tuple[Tuple[str, object], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    # Values are stringified at render time to keep observations cheap
+    return tuple(sorted(labels.items())) if len(labels) > 1 else tuple(labels.items())
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query: str) -> str:
+    """
+    Normalize a SQL statement so that queries differing only in literals
+    or whitespace share one metrics series
+
+    Args:
+        query: SQL query string
+
+    Returns:
+        Statement with literals replaced by ? and whitespace collapsed
+    """
+    normalized = re.sub(r"'(?:[^']|'')*'", '?', query)
+    normalized = re.sub(r'\b\d+(?:\.\d+)?\b', '?', normalized)
+    normalized = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?, ...)', normalized)
+    normalized = ' '.join(normalized.split())
+    return normalized[:200]
+
+
+class Counter:
+    """Monotonically increasing value, one series per label set"""
+
+    def __init__(self, name: str, documentation: str, lock: threading.Lock):
+        self.name = name
+        self.documentation = documentation
+        self._lock = lock
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets, one series per label set"""
+
+    def __init__(self, name: str, documentation: str, lock: threading.Lock,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = lock
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += bucket_count
+                le = (('le', _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics that can be rendered for a Prometheus scrape"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        """Get or create a counter"""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, documentation, threading.Lock())
+            return self._metrics[name]
+
+    def histogram(self, name: str, documentation: str,
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram"""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, threading.Lock(), buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format"""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Shared registry used by DatabaseHelper and the API
+registry = MetricsRegistry()
+
+# Content type for the /api/metrics endpoint
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def measure_overhead(iterations: int = 100000) -> Dict[str, float]:
+    """
+    Measure the cost of recording one observation
+
+    Args:
+        iterations: Number of observations to time
+
+    Returns:
+        Dictionary with nanoseconds per histogram observation,
+        counter increment and SQL normalization (cached)
+    """
+    local = MetricsRegistry()
+    histogram = local.histogram('overhead_seconds', 'Overhead benchmark')
+    counter = local.counter('overhead_total', 'Overhead benchmark')
+    query = "SELECT * FROM characters WHERE character_id = ?"
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        histogram.observe(0.0012, statement=query)
+    histogram_ns = (time.perf_counter() - start) / iterations * 1e9
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        counter.inc(statement=query)
+    counter_ns = (time.perf_counter() - start) / iterations * 1e9
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        normalize_sql(query)
+    normalize_ns = (time.perf_counter() - start) / iterations * 1e9
+
+    return {
+        'histogram_observe_ns': histogram_ns,
+        'counter_inc_ns': counter_ns,
+        'normalize_sql_ns': normalize_ns,
+    }
+
+
+if __name__ == '__main__':
+    print("Cyberpunk Tracker - Metrics Overhead")
+    print("=" * 50)
+    for name, value in measure_overhead().items():
+        print(f"  {name}: {value:.0f} ns")
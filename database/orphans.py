@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Orphan sweeping for Cyberpunk Tracker
+Removes child rows whose parent was deleted while foreign keys were not enforced
+"""
+
+import sqlite3
+from typing import Dict, List, NamedTuple
+
+from init_db import SHARED_TABLES
+
+# Every declared foreign key, one row per (child table, column)
+FOREIGN_KEYS_SQL = """
+    SELECT m.name AS child, f."from" AS child_column, f."table" AS parent, f."to" AS parent_column
+    FROM sqlite_master m
+    JOIN pragma_foreign_key_list(m.name) f
+    WHERE m.type = 'table'
+    ORDER BY m.rowid, f.id
+"""
+
+
+class ForeignKey(NamedTuple):
+    """A child column and the parent column it references"""
+    child: str
+    child_column: str
+    parent: str
+    parent_column: str
+
+    def orphan_condition(self) -> str:
+        """WHERE clause matching child rows whose parent is gone"""
+        return (f"{self.child_column} IS NOT NULL AND {self.child_column} NOT IN "
+                f"(SELECT {self.parent_column} FROM {self.parent})")
+
+
+def foreign_keys(conn: sqlite3.Connection) -> List[ForeignKey]:
+    """
+    List the foreign keys declared in a database, parent tables first
+
+    Args:
+        conn: Connection to the common database (shards leave out the
+            foreign keys that point at shared tables)
+
+    Returns:
+        One ForeignKey per child column, in table creation order
+    """
+    return [ForeignKey(*row) for row in conn.execute(FOREIGN_KEYS_SQL)]
+
+
+def unindexed_foreign_keys(conn: sqlite3.Connection) -> List[ForeignKey]:
+    """
+    Find foreign-key columns that no index starts with
+
+    Every cascade looks child rows up by the foreign-key column, so a
+    column without an index turns each parent delete into a full scan of
+    the child table. Partial indexes don't count, because the cascade
+    also has to find the rows they leave out.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        Foreign keys whose child column is not the first column of a full index
+    """
+    missing = []
+    for key in foreign_keys(conn):
+        leading = {row[0] for row in conn.execute(
+            "SELECT ii.name FROM pragma_index_list(?) il "
+            "JOIN pragma_index_info(il.name) ii WHERE il.partial = 0 AND ii.seqno = 0",
+            (key.child,)
+        )}
+        if key.child_column not in leading:
+            missing.append(key)
+    return missing
+
+
+class OrphanSweeper:
+    """
+    Deletes rows that point at parents which no longer exist
+
+    Rows deleted before foreign keys were enforced left their children
+    behind, and on shards the keys that point at shared tables (users,
+    items, maps) cannot be enforced at all. The sweeper checks every
+    declared foreign key and deletes the orphans in batches. Orphaned
+    characters go first, so their own child rows are removed by the
+    cascade.
+    """
+
+    def __init__(self, db, batch_size: int = 1000):
+        """
+        Initialize the sweeper
+
+        Args:
+            db: DatabaseHelper (every shard is swept when sharded)
+            batch_size: Rows deleted per transaction, so writers are not blocked for long
+        """
+        self.db = db
+        self.batch_size = batch_size
+
+    def _keys(self) -> List[ForeignKey]:
+        # Read from the common file, which declares every key
+        with self.db.get_connection() as conn:
+            return foreign_keys(conn)
+
+    def count(self) -> Dict[str, int]:
+        """
+        Count orphaned rows without deleting them
+
+        Returns:
+            Number of orphans per 'table.column', for keys that have any
+        """
+        counts = {}
+        keys = self._keys()
+        for helper in self.db.databases():
+            with helper.get_connection() as conn:
+                for key in keys:
+                    orphans = conn.execute(
+                        f"SELECT COUNT(*) FROM main.{key.child} WHERE {key.orphan_condition()}"
+                    ).fetchone()[0]
+                    if orphans:
+                        name = f"{key.child}.{key.child_column}"
+                        counts[name] = counts.get(name, 0) + orphans
+        return counts
+
+    def sweep(self) -> Dict[str, int]:
+        """
+        Delete every orphaned row
+
+        Returns:
+            Number of rows deleted per 'table.column', for keys that had any
+            (rows removed by the cascade from an orphaned character are not
+            counted separately)
+        """
+        deleted = {}
+        keys = self._keys()
+        for helper in self.db.databases():
+            for key in keys:
+                name = f"{key.child}.{key.child_column}"
+                while True:
+                    count = self._sweep_batch(helper, key)
+                    if not count:
+                        break
+                    deleted[name] = deleted.get(name, 0) + count
+        return deleted
+
+    def _sweep_batch(self, helper, key: ForeignKey) -> int:
+        """Delete up to batch_size orphans of one key from one database, through its write queue"""
+        if helper is self.db or key.parent not in SHARED_TABLES:
+            # The parent is in the same file, so the writer connection can check it
+            def work(conn):
+                return conn.execute(
+                    f"DELETE FROM {key.child} WHERE rowid IN ("
+                    f"SELECT rowid FROM {key.child} WHERE {key.orphan_condition()} LIMIT ?)",
+                    (self.batch_size,)
+                ).rowcount
+        else:
+            # A shard's writer connection doesn't attach the common file, so
+            # find the orphans on a reading connection first. Shared-table IDs
+            # are AUTOINCREMENT and never reused, so a row found here is still
+            # an orphan when it is deleted.
+            orphans = [(row['orphan_rowid'], row['parent_id']) for row in helper.execute_query(
+                f"SELECT rowid AS orphan_rowid, {key.child_column} AS parent_id FROM main.{key.child} "
+                f"WHERE {key.orphan_condition()} LIMIT ?", (self.batch_size,)
+            )]
+            if not orphans:
+                return 0
+
+            def work(conn):
+                return sum(conn.execute(
+                    f"DELETE FROM {key.child} WHERE rowid = ? AND {key.child_column} = ?", orphan
+                ).rowcount for orphan in orphans)
+        return helper.transaction(work, 'orphan_sweep')
+
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    from db_helper import DatabaseHelper
+
+    usage = """Usage:
+  python3 orphans.py check [db_path]    Count orphaned rows and list foreign keys without an index
+  python3 orphans.py sweep [db_path]    Delete orphaned rows"""
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('check', 'sweep'):
+        print(usage)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'cyberpunk_tracker.db'
+    shard_count = int(os.environ.get('CYBERPUNK_SHARDS', '0'))
+    db = DatabaseHelper(db_path, shard_count=shard_count)
+    sweeper = OrphanSweeper(db)
+
+    if command == 'check':
+        with db.get_connection() as conn:
+            for key in unindexed_foreign_keys(conn):
+                print(f"  No index on {key.child}({key.child_column}) -> {key.parent}")
+        counts = sweeper.count()
+        for name, count in counts.items():
+            print(f"  {name}: {count} orphaned rows")
+        print(f"✓ {sum(counts.values())} orphaned rows")
+    else:
+        for name, count in sweeper.sweep().items():
+            print(f"✓ Deleted {count} orphaned rows from {name}")
+        print("✓ Orphan sweep complete")
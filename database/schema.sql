@@ -93,6 +93,31 @@ CREATE TABLE IF NOT EXISTS critical_injuries (
     FOREIGN KEY (character_id) REFERENCES characters(character_id) ON DELETE CASCADE
 );
 
+-- Archive of inactive status effects and healed critical injuries
+-- (same columns as the hot tables, moved here by archive.py)
+CREATE TABLE IF NOT EXISTS status_effects_archive (
+    effect_id INTEGER PRIMARY KEY,
+    character_id INTEGER NOT NULL,
+    effect_name TEXT NOT NULL,
+    effect_type TEXT,
+    description TEXT,
+    duration TEXT,
+    active BOOLEAN DEFAULT 0,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (character_id) REFERENCES characters(character_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS critical_injuries_archive (
+    injury_id INTEGER PRIMARY KEY,
+    character_id INTEGER NOT NULL,
+    injury_name TEXT NOT NULL,
+    description TEXT,
+    date_received TIMESTAMP,
+    healed BOOLEAN DEFAULT 1,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (character_id) REFERENCES characters(character_id) ON DELETE CASCADE
+);
+
 -- Addictions table
 CREATE TABLE IF NOT EXISTS addictions (
     addiction_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -204,9 +229,62 @@ CREATE TABLE IF NOT EXISTS character_maps (
     FOREIGN KEY (map_id) REFERENCES maps(map_id) ON DELETE CASCADE
 );
 
+-- Sharding directory: which shard file holds each character.
+-- Only used when the API runs with several shards (see sharding.py).
+-- Character IDs are allocated here so they stay unique across shards.
+CREATE TABLE IF NOT EXISTS character_directory (
+    character_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    shard INTEGER NOT NULL
+);
+
+-- Users moved off their hash-assigned shard by rebalancing
+CREATE TABLE IF NOT EXISTS user_shards (
+    user_id INTEGER PRIMARY KEY,
+    shard INTEGER NOT NULL
+);
+
+-- Shard count the directory was built for. Starting with another count
+-- would route characters to the wrong file (see check_layout in sharding.py)
+CREATE TABLE IF NOT EXISTS shard_layout (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    shard_count INTEGER NOT NULL
+);
+
+-- Schema fingerprint (hash of this file), written by init_db.py so that
+-- startup can verify the schema with a single row lookup
+CREATE TABLE IF NOT EXISTS schema_info (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    fingerprint TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indexes for better query performance
 CREATE INDEX IF NOT EXISTS idx_characters_user ON characters(user_id);
 CREATE INDEX IF NOT EXISTS idx_inventory_character ON inventory(character_id);
 CREATE INDEX IF NOT EXISTS idx_stats_character ON stats(character_id);
 CREATE INDEX IF NOT EXISTS idx_contacts_character ON contacts(character_id);
-CREATE INDEX IF NOT EXISTS idx_cybernetics_character ON cybernetics(character_id);
+-- Covers humanity_cost so humanity can be summed from the index alone
+-- (it also serves lookups by character_id)
+DROP INDEX IF EXISTS idx_cybernetics_character;
+CREATE INDEX IF NOT EXISTS idx_cybernetics_humanity ON cybernetics(character_id, humanity_cost);
+CREATE INDEX IF NOT EXISTS idx_character_directory_user ON character_directory(user_id);
+-- Character sheets look up active effects and open injuries by character, and
+-- deleting a character cascades by character_id: one index per table serves both
+-- (resolved rows are moved to the archive tables, so these stay small)
+DROP INDEX IF EXISTS idx_status_effects_active;
+DROP INDEX IF EXISTS idx_critical_injuries_open;
+DROP INDEX IF EXISTS idx_status_effects_character;
+DROP INDEX IF EXISTS idx_critical_injuries_character;
+CREATE INDEX IF NOT EXISTS idx_status_effects_character_active ON status_effects(character_id, active);
+CREATE INDEX IF NOT EXISTS idx_critical_injuries_character_healed ON critical_injuries(character_id, healed);
+CREATE INDEX IF NOT EXISTS idx_status_effects_archive_character ON status_effects_archive(character_id, archived_at);
+CREATE INDEX IF NOT EXISTS idx_critical_injuries_archive_character ON critical_injuries_archive(character_id, archived_at);
+-- Every foreign-key column leads an index, so each ON DELETE CASCADE is an
+-- index lookup instead of a scan of the child table (checked by orphans.py)
+CREATE INDEX IF NOT EXISTS idx_background_character ON background(character_id);
+CREATE INDEX IF NOT EXISTS idx_addictions_character ON addictions(character_id);
+CREATE INDEX IF NOT EXISTS idx_reputation_character ON reputation(character_id);
+CREATE INDEX IF NOT EXISTS idx_ammo_character ON ammo(character_id);
+CREATE INDEX IF NOT EXISTS idx_inventory_item ON inventory(item_id);
+CREATE INDEX IF NOT EXISTS idx_character_maps_map ON character_maps(map_id);
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Sharding for Cyberpunk Tracker
+Spreads characters over several SQLite files so writes don't share one lock
+"""
+
+import heapq
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from archive import ARCHIVED_TABLES
+from init_db import ensure_schema
+
+# Tables holding per-character rows; all of them move with their character
+CHARACTER_TABLES = (
+    'characters', 'background', 'contacts', 'status_effects', 'critical_injuries',
+    'addictions', 'reputation', 'stats', 'inventory', 'ammo', 'cybernetics',
+    'character_maps', 'status_effects_archive', 'critical_injuries_archive',
+)
+
+
+def shard_path(db_path: str, shard: int) -> str:
+    """Get the file name of a shard, e.g. cyberpunk_tracker.shard0.db"""
+    base, ext = os.path.splitext(db_path)
+    return f"{base}.shard{shard}{ext or '.db'}"
+
+
+def check_layout(db_path: str, shard_count: int):
+    """
+    Refuse to run with a shard count that doesn't match the stored data
+
+    The shard count is stored in the common file the first time it is
+    checked. A different count would route users to the wrong shard, and
+    turning sharding on or off would hide the characters stored the other
+    way, so both are refused.
+
+    Args:
+        db_path: Common database file
+        shard_count: Shard count about to be used (0 or 1: not sharded)
+
+    Raises:
+        RuntimeError: If the count differs from the stored one, or characters
+            are in the common file while sharded or in shards while not
+    """
+    shard_count = shard_count if shard_count > 1 else 0
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT shard_count FROM shard_layout WHERE id = 1").fetchone()
+        stored = row[0] if row else None
+        if stored is None and conn.execute("SELECT EXISTS (SELECT 1 FROM character_directory)").fetchone()[0]:
+            # Sharded before the count was stored: the count can't be checked
+            stored = shard_count or -1
+        if not shard_count:
+            if stored:
+                raise RuntimeError(
+                    f"{db_path} keeps its characters in shard files; "
+                    f"set CYBERPUNK_SHARDS={stored if stored > 0 else 'the shard count'}")
+            return
+        if stored is not None and stored != shard_count:
+            raise RuntimeError(f"{db_path} is split into {stored} shards, not {shard_count}; "
+                               f"set CYBERPUNK_SHARDS={stored}")
+        unmigrated = conn.execute("SELECT COUNT(*) FROM main.characters").fetchone()[0]
+        if unmigrated:
+            raise RuntimeError(f"{unmigrated} characters in {db_path} are not in a shard yet; "
+                               f"run 'python3 sharding.py {shard_count} migrate' first")
+        conn.execute("INSERT OR IGNORE INTO shard_layout (id, shard_count) VALUES (1, ?)", (shard_count,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _insert(conn, table: str, columns: List[str], rows: List[tuple]):
+    """Insert rows given as tuples in `columns` order"""
+    if rows:
+        conn.executemany(
+            f"INSERT INTO main.{table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})", rows
+        )
+
+
+class ShardRouter:
+    """
+    Routes character data to shard files
+
+    The main database (the "common" file) keeps users, items, maps and the
+    character directory. Each shard holds characters and their child rows
+    and attaches the common file as `common`, so queries that join items
+    or maps work unchanged.
+    """
+
+    def __init__(self, common, shard_count: int):
+        """
+        Initialize the router and create missing shard files
+
+        Args:
+            common: DatabaseHelper for the common database
+            shard_count: Number of shard files
+
+        Raises:
+            RuntimeError: If a shard file can't be brought up to the current schema
+        """
+        self.common = common
+        self.shard_count = shard_count
+        self.paths = [shard_path(common.db_path, i) for i in range(shard_count)]
+        for path in self.paths:
+            if not ensure_schema(path, shard=True):
+                raise RuntimeError(f"Shard {path} could not be brought up to the current schema")
+
+        # Shard helpers are the same class as the common helper, minus sharding
+        self.shards = [
+            type(common)(path, metrics=common.metrics,
+                         slow_query_threshold=common.slow_queries.threshold,
+                         attach={'common': common.db_path},
+                         write_queue_window=common.write_queue_window)
+            for path in self.paths
+        ]
+        self._pool = ThreadPoolExecutor(max_workers=shard_count, thread_name_prefix='cyberpunk-shard')
+
+    # ==================== Routing ====================
+
+    def hash_shard(self, user_id: int) -> int:
+        """Shard assigned to a user by hashing (stable across processes)"""
+        return zlib.crc32(str(user_id).encode('utf-8')) % self.shard_count
+
+    def shard_for_user(self, user_id: int) -> int:
+        """Shard holding a user's characters (rebalanced users override the hash)"""
+        override = self.common.execute_query(
+            "SELECT shard FROM user_shards WHERE user_id = ?", (user_id,)
+        )
+        return override[0]['shard'] if override else self.hash_shard(user_id)
+
+    def shard_for_character(self, character_id: int) -> Optional[int]:
+        """Shard holding a character, or None if it doesn't exist"""
+        row = self.common.execute_query(
+            "SELECT shard FROM character_directory WHERE character_id = ?", (character_id,)
+        )
+        return row[0]['shard'] if row else None
+
+    def for_user(self, user_id: int):
+        """DatabaseHelper for a user's shard"""
+        return self.shards[self.shard_for_user(user_id)]
+
+    def for_character(self, character_id: int):
+        """DatabaseHelper for a character's shard (shard 0 for unknown characters)"""
+        shard = self.shard_for_character(character_id)
+        return self.shards[shard if shard is not None else 0]
+
+    # ==================== Writes ====================
+
+    def create_character(self, user_id: int, handle: str, **kwargs) -> int:
+        """
+        Create a character on its user's shard
+
+        The ID comes from character_directory in the common file, so IDs are
+        unique across shards.
+        """
+        shard = self.shard_for_user(user_id)
+        character_id = self.common.execute_update(
+            "INSERT INTO character_directory (user_id, shard) VALUES (?, ?)", (user_id, shard)
+        )
+        try:
+            self.shards[shard].create_character(user_id, handle, character_id=character_id, **kwargs)
+        except sqlite3.Error:
+            self.common.execute_update(
+                "DELETE FROM character_directory WHERE character_id = ?", (character_id,)
+            )
+            raise
+        return character_id
+
+    def delete_character(self, character_id: int) -> int:
+        """Delete a character from its shard and from the directory"""
+        shard = self.shard_for_character(character_id)
+        if shard is None:
+            return 0
+        deleted = self.shards[shard].delete_character(character_id)
+        self.common.execute_update(
+            "DELETE FROM character_directory WHERE character_id = ?", (character_id,)
+        )
+        return deleted
+
+    def delete_user(self, user_id: int) -> Optional[Dict[str, int]]:
+        """
+        Delete a user's characters from their shard and the user from the common file
+
+        Both go through the write queues: the common transaction deletes the
+        user and waits for the shard's to delete the characters, so the user
+        stays if the shard fails. The common writer may wait on a shard
+        writer but never the other way round, so the two can't deadlock.
+        """
+        def delete_characters(conn):
+            characters = conn.execute(
+                "SELECT COUNT(*) FROM characters WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+            changes = conn.total_changes
+            conn.execute("DELETE FROM characters WHERE user_id = ?", (user_id,))
+            return characters, conn.total_changes - changes
+
+        def work(conn):
+            # Look the shard up under the common write lock, so a move can't switch it meanwhile
+            override = conn.execute("SELECT shard FROM user_shards WHERE user_id = ?", (user_id,)).fetchone()
+            changes = conn.total_changes
+            for table in ('character_directory', 'user_shards'):
+                conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+            if not conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,)).rowcount:
+                return None
+            rows = conn.total_changes - changes
+            shard = self.shards[override['shard'] if override else self.hash_shard(user_id)]
+            characters, shard_rows = shard.transaction(delete_characters, 'delete_user')
+            return {'characters_deleted': characters, 'rows_deleted': rows + shard_rows}
+
+        result = self.common.transaction(work, 'delete_user')
+        if result:
+            self.common.record_rows('delete_user', result['rows_deleted'])
+        return result
+
+    # ==================== Fan-out ====================
+
+    def fan_out(self, query: str, params: tuple = (),
+                sort_key: Optional[Callable[[Dict], object]] = None) -> List[Dict]:
+        """
+        Run a query on every shard in parallel and merge the results
+
+        SQLite releases the GIL while it executes, so shards are queried
+        concurrently. If each shard returns rows ordered by `sort_key`, the
+        merged result keeps that order.
+
+        Args:
+            query: SQL query string
+            params: Query parameters
+            sort_key: Key the shard results are ordered by
+
+        Returns:
+            Merged rows from all shards
+        """
+        futures = [self._pool.submit(shard.execute_query, query, params) for shard in self.shards]
+        results = [future.result() for future in futures]
+        if sort_key:
+            return list(heapq.merge(*results, key=sort_key))
+        return [row for rows in results for row in rows]
+
+    # ==================== Rebalancing ====================
+
+    def _copy_characters(self, source: sqlite3.Connection, target, character_ids: List[int]):
+        """
+        Copy characters and their child rows into a shard
+
+        The rows are read on `source` and written in one transaction through
+        the target's write queue (its writer connection can't attach the
+        source file). Character IDs are global (allocated in
+        character_directory), but child row IDs come from each file's own
+        AUTOINCREMENT counter and collide between shards, so child rows are
+        renumbered (see _insert_renumbered).
+        """
+        placeholders = ', '.join(['?'] * len(character_ids))
+        rows = {}
+        for table in CHARACTER_TABLES:
+            cursor = source.execute(
+                f"SELECT * FROM main.{table} WHERE character_id IN ({placeholders})", character_ids
+            )
+            rows[table] = ([column[0] for column in cursor.description], [tuple(row) for row in cursor])
+        archives = {spec[0] for spec in ARCHIVED_TABLES.values()}
+
+        def work(conn):
+            for table in CHARACTER_TABLES:
+                if table in archives:
+                    continue  # Renumbered together with their hot table
+                key = [r['name'] for r in conn.execute(f"PRAGMA main.table_info({table})") if r['pk']]
+                if table != 'characters' and len(key) == 1:
+                    tables = [table] + ([ARCHIVED_TABLES[table][0]] if table in ARCHIVED_TABLES else [])
+                    self._insert_renumbered(conn, tables, key[0], rows)
+                else:
+                    _insert(conn, table, *rows[table])
+
+        target.transaction(work, 'move_characters')
+
+    def _insert_renumbered(self, conn, tables: List[str], id_column: str, rows: Dict[str, tuple]):
+        """
+        Insert child rows with new IDs taken from the target's counter
+
+        `tables` is a hot table followed by its archive table, if any.
+        Archived rows keep the ID they had in the hot table, so both share one
+        ID space: they are renumbered together, in their original order, and
+        the hot table's counter is moved past every ID handed out.
+        """
+        hot = tables[0]
+        highest = ', '.join(f"(SELECT COALESCE(MAX({id_column}), 0) FROM main.{table})" for table in tables)
+        base = conn.execute(
+            f"SELECT MAX(COALESCE((SELECT seq FROM main.sqlite_sequence WHERE name = ?), 0), {highest})", (hot,)
+        ).fetchone()[0]
+        old_ids = sorted({row[columns.index(id_column)] for columns, table_rows in (rows[t] for t in tables)
+                          for row in table_rows})
+        new_ids = {old_id: base + i for i, old_id in enumerate(old_ids, 1)}
+        for table in tables:
+            columns, table_rows = rows[table]
+            position = columns.index(id_column)
+            _insert(conn, table, columns, [
+                row[:position] + (new_ids[row[position]],) + row[position + 1:] for row in table_rows
+            ])
+        if new_ids:
+            last = base + len(new_ids)
+            # Archive IDs don't advance the hot table's counter by themselves
+            if not conn.execute("UPDATE main.sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                                (last, hot)).rowcount:
+                conn.execute("INSERT INTO main.sqlite_sequence (name, seq) VALUES (?, ?)", (hot, last))
+
+    def _delete_characters(self, conn, character_ids: List[int]):
+        """Delete characters and their child rows on a connection (the caller commits)"""
+        placeholders = ', '.join(['?'] * len(character_ids))
+        for table in reversed(CHARACTER_TABLES):
+            conn.execute(f"DELETE FROM main.{table} WHERE character_id IN ({placeholders})", character_ids)
+
+    def move_user(self, user_id: int, target: int) -> int:
+        """
+        Move all of a user's characters to another shard
+
+        The source shard's write lock is taken first and held until the
+        rows are deleted from it. Meanwhile the rows are copied to the
+        target in one transaction and the directory is switched. A write
+        can therefore no longer land on the source between the copy and the
+        delete and vanish with it: writes routed to the source wait for the
+        move (up to the busy timeout) and then find the characters gone, so
+        they report 0 rows changed, and later writes go to the target.
+
+        Args:
+            user_id: User to move
+            target: Destination shard
+
+        Returns:
+            Number of characters moved
+        """
+        if not 0 <= target < self.shard_count:
+            raise ValueError(f"Shard {target} does not exist (0..{self.shard_count - 1})")
+
+        source = self.shard_for_user(user_id)
+        if source == target:
+            return 0
+
+        # A direct connection rather than a write queue request: the lock is
+        # held while this thread waits on the target's and the common writers
+        lock = self.shards[source].connect_writer()
+        try:
+            lock.execute("BEGIN IMMEDIATE")
+            character_ids = [r['character_id'] for r in self.common.execute_query(
+                "SELECT character_id FROM character_directory WHERE user_id = ? AND shard = ?", (user_id, source)
+            )]
+            if character_ids:
+                self._copy_characters(lock, self.shards[target], character_ids)
+
+            placeholders = ', '.join(['?'] * len(character_ids))
+
+            def switch(conn):
+                conn.execute("INSERT OR REPLACE INTO user_shards (user_id, shard) VALUES (?, ?)",
+                             (user_id, target))
+                conn.execute(f"UPDATE character_directory SET shard = ? WHERE character_id IN ({placeholders})",
+                             [target] + character_ids)
+
+            try:
+                self.common.transaction(switch, 'move_user')
+            except sqlite3.Error:
+                # The directory still points at the source: drop the copies
+                if character_ids:
+                    self.shards[target].transaction(
+                        lambda conn: self._delete_characters(conn, character_ids), 'move_characters'
+                    )
+                raise
+
+            if character_ids:
+                self._delete_characters(lock, character_ids)
+            lock.execute("COMMIT")
+        finally:
+            if lock.in_transaction:
+                lock.execute("ROLLBACK")
+            lock.close()
+        return len(character_ids)
+
+    def migrate_from_common(self, batch_size: int = 500) -> int:
+        """
+        Move characters stored in the common file (from before sharding) to shards
+
+        Args:
+            batch_size: Characters copied per transaction
+
+        Returns:
+            Number of characters moved
+        """
+        moved = 0
+        while True:
+            rows = self.common.execute_query(
+                "SELECT character_id, user_id FROM main.characters ORDER BY character_id LIMIT ?", (batch_size,)
+            )
+            if not rows:
+                return moved
+            by_shard: Dict[int, List[int]] = {}
+            for row in rows:
+                by_shard.setdefault(self.shard_for_user(row['user_id']), []).append(row['character_id'])
+
+            for shard, character_ids in by_shard.items():
+                with self.common.get_connection() as conn:
+                    self._copy_characters(conn, self.shards[shard], character_ids)
+
+                def switch(conn):
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO character_directory (character_id, user_id, shard) "
+                        "SELECT character_id, user_id, ? FROM characters WHERE character_id = ?",
+                        [(shard, cid) for cid in character_ids]
+                    )
+                    self._delete_characters(conn, character_ids)
+
+                self.common.transaction(switch, 'migrate_characters')
+            moved += len(rows)
+
+    def status(self) -> List[Dict]:
+        """Character count and file size per shard"""
+        counts = self.fan_out("SELECT COUNT(*) AS characters FROM characters")
+        return [
+            {'shard': i, 'path': path, 'characters': counts[i]['characters'],
+             'size_kb': os.path.getsize(path) // 1024}
+            for i, path in enumerate(self.paths)
+        ]
+
+    def close(self):
+        """Stop the fan-out worker threads"""
+        self._pool.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    import sys
+    from db_helper import DatabaseHelper
+
+    usage = """Usage:
+  python3 sharding.py <shards> status [db_path]                  Characters per shard
+  python3 sharding.py <shards> migrate [db_path]                 Move unsharded characters to shards
+  python3 sharding.py <shards> move <user_id> <shard> [db_path]  Move a user to another shard"""
+
+    if len(sys.argv) < 3 or not sys.argv[1].isdigit() or int(sys.argv[1]) < 2:
+        print(usage)
+        sys.exit(1)
+
+    count, command = int(sys.argv[1]), sys.argv[2]
+    args = sys.argv[3:]
+    if command == 'move':
+        if len(args) < 2:
+            print(usage)
+            sys.exit(1)
+        db_path = args[2] if len(args) > 2 else 'cyberpunk_tracker.db'
+    else:
+        db_path = args[0] if args else 'cyberpunk_tracker.db'
+
+    ensure_schema(db_path)
+    db = DatabaseHelper(db_path, shard_count=count)
+    router = db.shards
+
+    if command == 'status':
+        for shard in router.status():
+            print(f"  shard {shard['shard']}: {shard['characters']} characters, "
+                  f"{shard['size_kb']} KB ({shard['path']})")
+    elif command == 'migrate':
+        print(f"✓ Moved {router.migrate_from_common()} characters to {count} shards")
+        check_layout(db_path, count)
+    elif command == 'move':
+        moved = router.move_user(int(args[0]), int(args[1]))
+        print(f"✓ Moved {moved} characters of user {args[0]} to shard {args[1]}")
+    else:
+        print(usage)
+        sys.exit(1)
+    router.close()
@@ -0,0 +1,159 @@
+"""
+Slow-query log for Cyberpunk Tracker
+Keeps the most recent slow queries and their query plans in a ring buffer
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def param_shape(params) -> object:
+    """
+    Describe query parameters by type only, so values never end up in logs
+
+    Args:
+        params: Tuple, list or dict of bound parameters
+
+    Returns:
+        List of type names, or dict of name -> type name
+    """
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+def find_full_scans(plan: List[Dict]) -> List[str]:
+    """
+    Find table scans in EXPLAIN QUERY PLAN output
+
+    SQLite reports them as "SCAN TABLE x" (older versions) or "SCAN x".
+    Scans that go through an index are not counted.
+
+    Args:
+        plan: Rows from EXPLAIN QUERY PLAN (dicts with a 'detail' key)
+
+    Returns:
+        The plan details that are full table scans
+    """
+    scans = []
+    for step in plan:
+        detail = step.get('detail', '')
+        if detail.startswith('SCAN') and 'USING' not in detail and 'CONSTANT ROW' not in detail:
+            scans.append(detail)
+    return scans
+
+
+class SlowQueryLog:
+    """Ring buffer of slow queries, optionally mirrored to a rotating log file"""
+
+    def __init__(self, threshold: float = 0.1, capacity: int = 200,
+                 log_path: Optional[str] = None):
+        """
+        Initialize the slow-query log
+
+        Args:
+            threshold: Queries taking at least this many seconds are recorded
+            capacity: Number of entries kept in memory
+            log_path: Optional file for JSON lines (rotated at 1 MB, 3 backups)
+        """
+        self.threshold = threshold
+        self._entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._file_logger = None
+        if log_path:
+            self._file_logger = logging.getLogger(f"{__name__}.file.{log_path}")
+            self._file_logger.propagate = False
+            if not self._file_logger.handlers:
+                handler = RotatingFileHandler(log_path, maxBytes=1024 * 1024, backupCount=3)
+                self._file_logger.addHandler(handler)
+            self._file_logger.setLevel(logging.INFO)
+
+    def is_slow(self, duration: float) -> bool:
+        """Check whether a query duration crosses the threshold"""
+        return self.threshold is not None and duration >= self.threshold
+
+    def record(self, statement: str, query: str, params, duration: float,
+               plan: List[Dict]) -> Dict:
+        """
+        Record a slow query
+
+        Args:
+            statement: Normalized SQL statement
+            query: SQL text as executed
+            params: Bound parameters (only their types are stored)
+            duration: Execution time in seconds
+            plan: EXPLAIN QUERY PLAN rows
+
+        Returns:
+            The recorded entry
+        """
+        full_scans = find_full_scans(plan)
+        entry = {
+            'timestamp': time.time(),
+            'statement': statement,
+            'sql': ' '.join(query.split()),
+            'param_shape': param_shape(params),
+            'duration_ms': round(duration * 1000, 3),
+            'plan': [step.get('detail', '') for step in plan],
+            'full_scans': full_scans,
+        }
+        with self._lock:
+            self._entries.append(entry)
+
+        if full_scans:
+            logger.warning("Full table scan in slow query (%.1f ms): %s -- %s",
+                           entry['duration_ms'], entry['sql'], '; '.join(full_scans))
+        if self._file_logger:
+            self._file_logger.info(json.dumps(entry))
+        return entry
+
+    def entries(self) -> List[Dict]:
+        """Get recorded entries, oldest first"""
+        with self._lock:
+            return list(self._entries)
+
+    def worst_offenders(self, limit: int = 20) -> List[Dict]:
+        """
+        Group recorded entries by statement, slowest first
+
+        Args:
+            limit: Maximum number of statements returned
+
+        Returns:
+            List of dictionaries with count, max/avg duration, the latest
+            query plan and whether the statement scans a full table
+        """
+        groups: Dict[str, Dict] = {}
+        for entry in self.entries():
+            group = groups.get(entry['statement'])
+            if group is None:
+                group = groups[entry['statement']] = {
+                    'statement': entry['statement'],
+                    'count': 0,
+                    'max_ms': 0.0,
+                    'total_ms': 0.0,
+                }
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            group['param_shape'] = entry['param_shape']
+            group['plan'] = entry['plan']
+            group['full_scans'] = entry['full_scans']
+            group['last_seen'] = entry['timestamp']
+
+        offenders = sorted(groups.values(), key=lambda g: g['max_ms'], reverse=True)[:limit]
+        for group in offenders:
+            group['avg_ms'] = round(group.pop('total_ms') / group['count'], 3)
+        return offenders
+
+    def clear(self):
+        """Forget all recorded entries"""
+        with self._lock:
+            self._entries.clear()
@@ -5,6 +5,7 @@ Quick test script to verify database functionality
 
 from db_helper import DatabaseHelper
 import os
+import sqlite3
 
 def test_database():
     """Run basic tests on database functionality"""
@@ -26,6 +27,29 @@ def test_database():
         print("❌ Failed to initialize database")
         return False
     
+    # Schema fingerprint: verified, and outdated tables are migrated or rejected
+    from init_db import ensure_schema, verify_schema
+    assert verify_schema(test_db_path) and ensure_schema(test_db_path)
+    old_db_path = 'test_cyberpunk_old.db'
+    for path in (old_db_path, 'test_cyberpunk_extra.db'):
+        if os.path.exists(path):
+            os.remove(path)
+    conn = sqlite3.connect(old_db_path)
+    conn.execute("CREATE TABLE maps (map_id INTEGER PRIMARY KEY AUTOINCREMENT, map_name TEXT NOT NULL)")
+    conn.close()
+    assert not verify_schema(old_db_path)
+    assert ensure_schema(old_db_path) and verify_schema(old_db_path)
+    conn = sqlite3.connect(old_db_path)
+    assert 'map_type' in [row[1] for row in conn.execute("PRAGMA table_info(maps)")]
+    conn.close()
+    conn = sqlite3.connect('test_cyberpunk_extra.db')
+    conn.execute("CREATE TABLE maps (map_id INTEGER PRIMARY KEY, map_name TEXT, legacy_grid BLOB)")
+    conn.close()
+    assert not ensure_schema('test_cyberpunk_extra.db')
+    assert not verify_schema('test_cyberpunk_extra.db')
+    os.remove(old_db_path)
+    os.remove('test_cyberpunk_extra.db')
+    
     db = DatabaseHelper(test_db_path)
     
     # Test 1: Create user
@@ -118,9 +142,518 @@ def test_database():
         print(f"  ❌ Character update failed: {e}")
         return False
     
+    # Test 8: Query metrics
+    print("\n9. Testing query metrics...")
+    try:
+        duration = db.metrics.histogram('cyberpunk_db_query_duration_seconds', '')
+        statement = "SELECT * FROM characters WHERE character_id = ?"
+        before = duration.count(statement=statement)
+        db.get_character(char_id)
+        assert duration.count(statement=statement) == before + 1
+        assert 'cyberpunk_db_rows_returned_total' in db.metrics.render()
+        print("  ✓ Query metrics recorded")
+    except Exception as e:
+        print(f"  ❌ Query metrics failed: {e}")
+        return False
+    
+    # Test 9: Slow-query log
+    print("\n10. Testing slow-query log...")
+    try:
+        slow_db = DatabaseHelper(test_db_path, slow_query_threshold=0)
+        slow_db.execute_query("SELECT * FROM characters WHERE handle = ?", ('TestChar',))
+        offenders = slow_db.slow_queries.worst_offenders()
+        assert len(offenders) == 1
+        assert offenders[0]['param_shape'] == ['str']
+        assert offenders[0]['full_scans'], "expected a full table scan on characters.handle"
+        print("  ✓ Slow query logged with query plan")
+    except Exception as e:
+        print(f"  ❌ Slow-query log failed: {e}")
+        return False
+    
+    # Test 10: Group-commit write queue
+    print("\n11. Testing write queue...")
+    try:
+        queued_db = DatabaseHelper(test_db_path, write_queue_window=0.001)
+        with queued_db.batch():
+            queued_db.update_character(char_id, hp=30)
+            queued_db.add_contact(char_id, 'friend', 'Queued Friend')
+            # Writes are only applied when the batch ends
+            assert queued_db.get_character(char_id)['hp'] == 35
+        assert queued_db.get_character(char_id)['hp'] == 30
+        
+        # A failing request is rolled back as a whole
+        try:
+            with queued_db.batch():
+                queued_db.update_character(char_id, hp=1)
+                queued_db.execute_update("UPDATE no_such_table SET x = 1")
+            assert False, "expected the batch to fail"
+        except sqlite3.OperationalError:
+            pass
+        assert queued_db.get_character(char_id)['hp'] == 30
+        
+        # Errors other than sqlite3.Error reach the caller and leave the writer running
+        try:
+            queued_db.update_character(char_id, hp=10 ** 30)
+            assert False, "expected the write to fail"
+        except OverflowError:
+            pass
+        queued_db.update_character(char_id, hp=31)
+        assert queued_db.get_character(char_id)['hp'] == 31
+        queued_db.update_character(char_id, hp=30)
+        queued_db.write_queue.close()
+        print("  ✓ Batched writes committed together and rolled back together")
+    except Exception as e:
+        print(f"  ❌ Write queue failed: {e}")
+        return False
+    
+    # Test 11: Combat simulation
+    print("\n12. Testing combat simulation...")
+    try:
+        from combat import parse_dice, simulate, equipped_matchup
+        assert parse_dice('3d6+2') == (3, 6, 2)
+        result = simulate('2d6', armor=0, hp=10)
+        assert 7.0 < result['mean_damage'] < 7.3
+        assert result['kill_probability'] == sorted(result['kill_probability'])
+        assert simulate('2d6', armor=0, hp=10) == result
+        # Fixed damage over several hits: 5 vs SP 3 ablating to 2 and 1 deals 2, 3 and 4
+        assert simulate('1d1+4', armor=3, hp=9, hits=3, trials=100)['kill_probability'] == [0.0, 0.0, 1.0]
+        # Unarmored targets take exactly the damage rolled (armor never goes negative)
+        assert simulate('1d1', armor=0, hp=3, hits=3, trials=100)['kill_probability'] == [0.0, 0.0, 1.0]
+        assert simulate('1d1', armor=0, hp=6, hits=3, trials=100)['kill_probability'] == [0.0, 0.0, 0.0]
+        for too_big in (lambda: parse_dice('999999d6'), lambda: simulate('2d6', trials=10 ** 9)):
+            try:
+                too_big()
+                assert False, "expected the simulation to be refused"
+            except ValueError:
+                pass
+        
+        db.execute_update("UPDATE items SET damage = '2d6' WHERE item_id = ?", (item_id,))
+        db.execute_update("UPDATE inventory SET equipped = 1 WHERE item_id = ?", (item_id,))
+        matchup = equipped_matchup(db, char_id, char_id, hits=3, trials=1000)
+        assert [w['item_name'] for w in matchup['weapons']] == ['Test Pistol']
+        assert matchup['target_armor'] == 0
+        print("  ✓ Dice parsed and equipped weapons simulated")
+    except Exception as e:
+        print(f"  ❌ Combat simulation failed: {e}")
+        return False
+    
+    # Test 12: Humanity recompute
+    print("\n13. Testing humanity recompute...")
+    try:
+        import humanity
+        db.update_character(char_id, humanity=50, max_humanity=50)
+        report = humanity.recompute_humanity(db, dry_run=True)
+        assert report['changes'] == [{'character_id': char_id, 'handle': 'TestChar', 'stored': 50, 'expected': 45}]
+        assert humanity.recompute_humanity(db)['updated'] == 1
+        assert db.get_character(char_id)['humanity'] == 45
+        
+        assert not humanity.triggers_installed(db)
+        humanity.install_triggers(db)
+        assert humanity.triggers_installed(db)
+        extra_id = db.add_cybernetic(char_id, 'Extra Implant', 'Leg', humanity_cost=3)
+        assert db.get_character(char_id)['humanity'] == 42
+        db.execute_update("DELETE FROM cybernetics WHERE cybernetic_id = ?", (extra_id,))
+        assert db.get_character(char_id)['humanity'] == 45
+        humanity.remove_triggers(db)
+        assert not humanity.triggers_installed(db)
+        print("  ✓ Humanity recomputed in bulk and kept up to date by triggers")
+    except Exception as e:
+        print(f"  ❌ Humanity recompute failed: {e}")
+        return False
+    
+    # Test 13: Combat round
+    print("\n14. Testing combat round...")
+    try:
+        from combat_round import apply_round
+        db.update_character(char_id, hp=30, max_hp=40)
+        ammo_id = db.execute_update(
+            "INSERT INTO ammo (character_id, ammo_type, quantity) VALUES (?, ?, ?)",
+            (char_id, 'Test Rounds', 10)
+        )
+        state = apply_round(db, [
+            {'type': 'hp', 'character_id': char_id, 'delta': -8},
+            {'type': 'ammo', 'character_id': char_id, 'ammo_id': ammo_id, 'delta': -4},
+            {'type': 'status_effect', 'character_id': char_id, 'effect_name': 'Stunned'},
+        ])
+        assert state[0]['hp'] == 22
+        assert state[0]['ammo'][0]['quantity'] == 6
+        assert [e['effect_name'] for e in state[0]['status_effects']] == ['Stunned']
+        
+        # Running out of ammo rolls back the whole round
+        try:
+            apply_round(db, [
+                {'type': 'hp', 'character_id': char_id, 'delta': -8},
+                {'type': 'ammo', 'character_id': char_id, 'ammo_id': ammo_id, 'delta': -7},
+            ])
+            assert False, "expected the round to fail"
+        except ValueError:
+            pass
+        assert db.get_character(char_id)['hp'] == 22
+        
+        # Values SQLite can't store and non-string names are rejected up front
+        for bad in ({'type': 'hp', 'character_id': char_id, 'delta': 2 ** 70},
+                    {'type': 'status_effect', 'character_id': char_id, 'effect_name': {'name': 'Stunned'}}):
+            try:
+                apply_round(db, [bad])
+                assert False, "expected the round to be rejected"
+            except ValueError:
+                pass
+        
+        # Through the write queue, timed like any other write
+        queued_db = DatabaseHelper(test_db_path, write_queue_window=0.001)
+        duration = queued_db.metrics.histogram('cyberpunk_db_query_duration_seconds', '')
+        before = duration.count(statement='combat_round')
+        assert apply_round(queued_db, [{'type': 'hp', 'character_id': char_id, 'delta': 1}])[0]['hp'] == 23
+        try:
+            apply_round(queued_db, [
+                {'type': 'hp', 'character_id': char_id, 'delta': -8},
+                {'type': 'ammo', 'character_id': char_id, 'ammo_id': ammo_id, 'delta': -7},
+            ])
+            assert False, "expected the round to fail"
+        except ValueError:
+            pass
+        queued_db.write_queue.close()
+        assert db.get_character(char_id)['hp'] == 23
+        assert duration.count(statement='combat_round') == before + 1
+        db.update_character(char_id, hp=22)
+        print("  ✓ Round applied in one transaction and rolled back on invariant violation")
+    except Exception as e:
+        print(f"  ❌ Combat round failed: {e}")
+        return False
+    
+    # Test 14: Archival
+    print("\n15. Testing archival...")
+    try:
+        from archive import Archiver
+        archiver = Archiver(db)
+        injury_id = db.execute_update(
+            "INSERT INTO critical_injuries (character_id, injury_name, healed) VALUES (?, ?, 1)",
+            (char_id, 'Old Wound')
+        )
+        assert archiver.archive() == {'status_effects': 0, 'critical_injuries': 1}
+        assert db.get_table_count('critical_injuries') == 0
+        assert [i['injury_id'] for i in archiver.history(char_id)['critical_injuries']] == [injury_id]
+        
+        archiver.install_triggers()
+        db.execute_update("UPDATE status_effects SET active = 0 WHERE character_id = ?", (char_id,))
+        assert db.get_table_count('status_effects') == 0
+        assert [e['effect_name'] for e in archiver.history(char_id)['status_effects']] == ['Stunned']
+        archiver.remove_triggers()
+        
+        # A failed scheduled run is logged and the next run still happens
+        import logging
+        import time
+        from jobs import PeriodicJob
+        failures = []
+        handler = logging.Handler()
+        handler.emit = failures.append
+        logging.getLogger('jobs').addHandler(handler)
+        logging.getLogger('jobs').propagate = False
+        runs = []
+        
+        def flaky_archive():
+            runs.append(len(runs))
+            if len(runs) == 1:
+                raise sqlite3.OperationalError('database is locked')
+            return archiver.archive()
+        
+        job = PeriodicJob('archive', flaky_archive, 0.01)
+        job.start()
+        deadline = time.time() + 5
+        while len(runs) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        job.stop()
+        logging.getLogger('jobs').removeHandler(handler)
+        logging.getLogger('jobs').propagate = True
+        assert len(runs) >= 2
+        assert [r.getMessage() for r in failures] == ['Scheduled archive failed']
+        print("  ✓ Resolved rows moved to archive tables and served as history")
+    except Exception as e:
+        print(f"  ❌ Archival failed: {e}")
+        return False
+    
+    # Test 15: Cascaded deletes
+    print("\n16. Testing cascaded deletes...")
+    try:
+        from orphans import OrphanSweeper, unindexed_foreign_keys
+        with db.get_connection() as conn:
+            assert unindexed_foreign_keys(conn) == []
+        
+        doomed_user = db.create_user('doomed_user', 'hashed_password')
+        doomed_char = db.create_character(doomed_user, 'Doomed')
+        db.set_character_stats(doomed_char, body=4)
+        db.add_contact(doomed_char, 'enemy', 'Adam Smasher')
+        assert db.delete_user(doomed_user) == {'characters_deleted': 1, 'rows_deleted': 4}
+        assert db.delete_user(doomed_user) is None
+        assert db.get_character(doomed_char) is None
+        
+        # Orphan left behind by a connection without foreign keys
+        conn = sqlite3.connect(test_db_path)
+        conn.execute("INSERT INTO stats (character_id) VALUES (?)", (doomed_char,))
+        conn.commit()
+        conn.close()
+        sweeper = OrphanSweeper(db)
+        assert sweeper.count() == {'stats.character_id': 1}
+        assert sweeper.sweep() == {'stats.character_id': 1}
+        assert sweeper.count() == {}
+        print("  ✓ User deleted with all child rows, orphans swept")
+    except Exception as e:
+        print(f"  ❌ Cascaded deletes failed: {e}")
+        return False
+    
+    # Test 16: Backups
+    print("\n17. Testing backups...")
+    try:
+        import tempfile
+        from backup import BackupManager
+        with tempfile.TemporaryDirectory() as backup_dir:
+            manager = BackupManager(test_db_path, backup_dir=backup_dir, keep=3, step_sleep=0)
+            for _ in range(4):
+                manager.snapshot()
+            backups = manager.list_backups()
+            assert len(backups) == 3
+            
+            db.create_user('after_backup', 'hashed_password')
+            # Retention limit is full: restoring the oldest snapshot must not prune it first
+            safety = manager.restore(backups[-1])
+            assert db.get_user_by_username('after_backup') is None
+            assert db.get_character(char_id)['handle'] == 'TestChar'
+            assert safety in manager.list_backups() and backups[-1] in manager.list_backups()
+            
+            try:
+                manager.restore(os.path.join(backup_dir, 'missing.db'))
+                assert False, "restoring a missing snapshot should fail"
+            except ValueError:
+                pass
+            assert not os.path.exists(os.path.join(backup_dir, 'missing.db'))
+            
+            # A write after every step would restart a stepped copy forever
+            from backup import backup_database, check_integrity
+            writer = sqlite3.connect(test_db_path)
+            steps = []
+            
+            def write_each_step(remaining, total):
+                steps.append(remaining)
+                writer.execute("UPDATE characters SET notes = ? WHERE character_id = ?", (str(len(steps)), char_id))
+                writer.commit()
+            
+            busy_path = os.path.join(backup_dir, 'busy.db')
+            backup_database(test_db_path, busy_path, pages=1, step_sleep=0, progress=write_each_step)
+            writer.close()
+            assert steps[-1] == 0 and len(steps) < 100
+            assert check_integrity(busy_path)
+        print("  ✓ Snapshots pruned and restored, missing snapshot rejected")
+    except Exception as e:
+        print(f"  ❌ Backups failed: {e}")
+        return False
+    
+    # Test 17: Sharding
+    print("\n18. Testing sharding...")
+    try:
+        from sharding import check_layout
+        from orphans import OrphanSweeper
+        check_layout(test_db_path, 0)
+        sharded_db = DatabaseHelper(test_db_path, shard_count=2)
+        layout_errors = 0
+        try:
+            check_layout(test_db_path, 2)
+        except RuntimeError:
+            layout_errors += 1  # Characters not migrated yet
+        sharded_db.shards.migrate_from_common()
+        check_layout(test_db_path, 2)
+        for count in (0, 3):
+            try:
+                check_layout(test_db_path, count)
+            except RuntimeError:
+                layout_errors += 1
+        assert layout_errors == 3
+        assert sharded_db.get_character(char_id)['handle'] == 'TestChar'
+        assert len(sharded_db.get_character_inventory(char_id)) == 1
+        
+        other_user = sharded_db.create_user('shard_user', 'hashed_password')
+        other_char = sharded_db.create_character(other_user, 'ShardChar')
+        assert other_char != char_id
+        handles = [c['handle'] for c in sharded_db.fan_out(
+            "SELECT handle FROM characters ORDER BY handle", sort_key=lambda c: c['handle'])]
+        assert handles == ['ShardChar', 'TestChar']
+        
+        # The target shard already holds rows whose IDs overlap the moved ones
+        target = 1 - sharded_db.shards.shard_for_user(user_id)
+        # The source shard stays write-locked while the rows are copied
+        copy_characters = sharded_db.shards._copy_characters
+        locked = []
+        
+        def copy_while_writing(*args):
+            source_path = sharded_db.shards.paths[1 - target]
+            try:
+                sqlite3.connect(source_path, timeout=0).execute("DELETE FROM stats WHERE 0")
+            except sqlite3.OperationalError:
+                locked.append(source_path)
+            copy_characters(*args)
+        
+        sharded_db.shards._copy_characters = copy_while_writing
+        sharded_db.shards.move_user(other_user, target)
+        del sharded_db.shards._copy_characters
+        assert locked
+        sharded_db.set_character_stats(other_char, reflexes=3)
+        sharded_db.add_contact(other_char, 'friend', 'Shard Friend')
+        sharded_db.for_character(other_char).execute_update(
+            "INSERT INTO critical_injuries (character_id, injury_name, healed) VALUES (?, 'Shard Wound', 1)",
+            (other_char,)
+        )
+        shard_archiver = Archiver(sharded_db)
+        shard_archiver.archive()
+        
+        # Batches belong to one shard: the sharded helper would miss routed writes
+        try:
+            with sharded_db.batch():
+                pass
+            assert False, "expected batch() on a sharded helper to fail"
+        except RuntimeError:
+            pass
+        with sharded_db.for_character(other_char).batch():
+            sharded_db.for_character(other_char).add_contact(other_char, 'enemy', 'Batched Enemy')
+        assert [c['name'] for c in sharded_db.get_character_contacts(other_char, 'enemy')] == ['Batched Enemy']
+        
+        # A round across two shards commits on both or on neither
+        hp_before = {cid: sharded_db.get_character(cid)['hp'] for cid in (char_id, other_char)}
+        state = apply_round(sharded_db, [{'type': 'hp', 'character_id': cid, 'delta': 1} for cid in hp_before])
+        assert [c['hp'] for c in state] == [hp_before[cid] + 1 for cid in sorted(hp_before)]
+        for cid, failing in ((char_id, other_char), (other_char, char_id)):
+            try:
+                apply_round(sharded_db, [{'type': 'hp', 'character_id': cid, 'delta': -1},
+                                         {'type': 'ammo', 'character_id': failing, 'ammo_id': 999, 'delta': -1}])
+                assert False, "expected the round to fail"
+            except ValueError:
+                pass
+        assert all(sharded_db.get_character(cid)['hp'] == hp + 1 for cid, hp in hp_before.items())
+        
+        assert sharded_db.shards.move_user(user_id, target) == 1
+        assert sharded_db.shards.shard_for_character(char_id) == target
+        assert sharded_db.get_character_stats(char_id)['reflexes'] == 8
+        assert sharded_db.get_character_stats(other_char)['reflexes'] == 3
+        assert [i['injury_name'] for i in shard_archiver.history(char_id)['critical_injuries']] == ['Old Wound']
+        assert [i['injury_name'] for i in shard_archiver.history(other_char)['critical_injuries']] == ['Shard Wound']
+        assert [e['effect_name'] for e in shard_archiver.history(char_id)['status_effects']] == ['Stunned']
+        # New rows on the target get IDs past the ones handed out by the move
+        sharded_db.for_character(char_id).execute_update(
+            "INSERT INTO critical_injuries (character_id, injury_name, healed) VALUES (?, 'New Wound', 1)",
+            (char_id,)
+        )
+        shard_archiver.archive()
+        assert [i['injury_name'] for i in shard_archiver.history(char_id)['critical_injuries']] == [
+            'New Wound', 'Old Wound']
+        assert sharded_db.delete_user(other_user)['characters_deleted'] == 1
+        assert sharded_db.shards.shard_for_character(other_char) is None
+        
+        with tempfile.TemporaryDirectory() as backup_dir:
+            manager = BackupManager(test_db_path, backup_dir=backup_dir, step_sleep=0,
+                                    shard_paths=sharded_db.shards.paths)
+            snapshot = manager.snapshot()
+            assert all(len(manager.list_backups(path)) == 1
+                       for path in [test_db_path] + sharded_db.shards.paths)
+            # Restoring the set brings back the shard files too
+            hp = sharded_db.get_character(char_id)['hp']
+            sharded_db.update_character(char_id, hp=hp - 1)
+            manager.restore(snapshot, safety_snapshot=False)
+            assert sharded_db.get_character(char_id)['hp'] == hp
+        sharded_db.shards.close()
+        
+        # Moves, sweeps and user deletes go through the shards' write queues
+        queued_db = DatabaseHelper(test_db_path, shard_count=2, write_queue_window=0.001)
+        queued_user = queued_db.create_user('queued_user', 'hashed_password')
+        queued_char = queued_db.create_character(queued_user, 'QueuedChar')
+        queued_db.shards.move_user(queued_user, 1 - queued_db.shards.shard_for_user(queued_user))
+        queued_db.for_character(queued_char).execute_update(
+            "INSERT INTO inventory (character_id, item_id, quantity) VALUES (?, 99999, 1)", (queued_char,)
+        )
+        assert OrphanSweeper(queued_db).sweep() == {'inventory.item_id': 1}
+        assert queued_db.delete_user(queued_user)['characters_deleted'] == 1
+        assert queued_db.get_character(queued_char) is None
+        for helper in queued_db.databases():
+            helper.write_queue.close()
+        queued_db.shards.close()
+        print("  ✓ Characters routed, merged, rebalanced and backed up across shards")
+    except Exception as e:
+        print(f"  ❌ Sharding failed: {e}")
+        return False
+    
+    # Test 18: Map tiles
+    print("\n19. Testing map tiles...")
+    try:
+        import sys
+        import tempfile
+        from PIL import Image
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+        from map_tiles import MapTileService
+        with tempfile.TemporaryDirectory() as tile_dir:
+            image_path = os.path.join(tile_dir, 'night_city.png')
+            Image.new('RGB', (300, 200), 'magenta').save(image_path)
+            map_id = db.execute_update(
+                "INSERT INTO maps (map_name, map_type, image_path) VALUES ('Night City', 'world', ?)",
+                (image_path,)
+            )
+            tiles = MapTileService(db, os.path.join(tile_dir, 'cache'), tile_size=128)
+            manifest = tiles.get_manifest(map_id)
+            assert (manifest['max_zoom'], len(manifest['tiles'])) == (2, 6 + 2 + 1)
+            assert all(os.path.isfile(tiles.tile_path(map_id, digest)) for digest in manifest['tiles'].values())
+            assert tiles.get_manifest(map_id) is manifest
+            
+            # Any change to the maps row gives a new fingerprint and a rebuilt pyramid
+            db.execute_update("UPDATE maps SET map_name = 'Night City 2077' WHERE map_id = ?", (map_id,))
+            rebuilt = tiles.get_manifest(map_id)
+            assert rebuilt['fingerprint'] != manifest['fingerprint']
+            
+            # A new image replaces the old tiles on disk
+            Image.new('RGB', (300, 200), 'cyan').save(image_path)
+            os.utime(image_path, ns=(0, os.stat(image_path).st_mtime_ns + 1))
+            recolored = tiles.get_manifest(map_id)
+            assert set(recolored['tiles'].values()).isdisjoint(rebuilt['tiles'].values())
+            cached = {name[:-4] for name in os.listdir(os.path.join(tile_dir, 'cache', str(map_id)))
+                      if name.endswith('.png')}
+            assert cached == set(recolored['tiles'].values())
+        print("  ✓ Tile pyramid built, cached and rebuilt when the map changes")
+    except Exception as e:
+        print(f"  ❌ Map tiles failed: {e}")
+        return False
+    
+    # Test 19: Static assets
+    print("\n20. Testing static assets...")
+    try:
+        from static_assets import StaticAssetServer
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, 'js'))
+            script = os.path.join(root, 'js', 'app.js')
+            with open(script, 'w') as f:
+                f.write("console.log('wake up, samurai');\n" * 200)
+            gzip_dir = os.path.join(root, 'static_cache')
+            assets = StaticAssetServer(root, gzip_dir=gzip_dir, memory_limit=64)
+            old_gzip = assets.lookup('js/app.js')[0].gzip_path
+            assert os.listdir(gzip_dir) == [os.path.basename(old_gzip)]
+            
+            # A changed file gets a new fingerprint; its old gzip variant is removed
+            with open(script, 'a') as f:
+                f.write("console.log('we have a city to burn');\n")
+            assets.build()
+            new_gzip = assets.lookup('js/app.js')[0].gzip_path
+            assert new_gzip != old_gzip
+            assert os.listdir(gzip_dir) == [os.path.basename(new_gzip)]
+            
+            # gzip;q=0 means the client refuses gzip
+            from flask import Flask
+            for accept, encoding in (('gzip, br', 'gzip'), ('gzip;q=0', None)):
+                with Flask(__name__).test_request_context(headers={'Accept-Encoding': accept}):
+                    assert assets.serve('js/app.js').headers.get('Content-Encoding') == encoding
+        print("  ✓ Stale gzip variants pruned on rebuild, Accept-Encoding q-values honored")
+    except Exception as e:
+        print(f"  ❌ Static assets failed: {e}")
+        return False
+    
     # Clean up
-    print("\n9. Cleaning up...")
+    print("\n21. Cleaning up...")
     os.remove(test_db_path)
+    for shard in range(2):
+        os.remove(f"test_cyberpunk.shard{shard}.db")
     print("  ✓ Test database removed")
     
     print("\n" + "=" * 50)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Group-commit write queue for Cyberpunk Tracker
+One writer thread applies queued writes, many requests per transaction
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+Statement = Tuple[str, tuple]
+# A request is a list of statements, or a function called with the connection
+Request = Union[List[Statement], Callable[[sqlite3.Connection], Any]]
+
+# Batch-size buckets (number of requests per commit)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def statement_result(cursor, query: str) -> int:
+    """Last row ID for INSERT, or number of affected rows (same as execute_update)"""
+    return cursor.lastrowid if query.strip().upper().startswith('INSERT') else cursor.rowcount
+
+
+class WriteQueue:
+    """
+    Serializes writes through a single background thread
+
+    Each submit() is one request: a list of statements that is applied
+    atomically (run() queues a function instead, for writes that check
+    their own results). Requests that arrive within `window` seconds of each other
+    share one transaction, so SQLite takes the write lock and syncs to disk
+    once per group instead of once per statement. Each request runs in its
+    own SAVEPOINT, so a failing request is rolled back without affecting
+    the others in the group.
+    """
+
+    def __init__(self, helper, window: float = 0.002, max_batch: int = 256):
+        """
+        Start the writer thread
+
+        Args:
+            helper: DatabaseHelper whose database is written to
+            window: Seconds to wait for more requests before committing
+            max_batch: Maximum number of requests per transaction
+        """
+        self.helper = helper
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Optional[Tuple[Request, Future, float]]]" = queue.Queue()
+
+        metrics = helper.metrics
+        self._batch_size = metrics.histogram(
+            'cyberpunk_db_write_batch_size', 'Requests committed per group-commit transaction', BATCH_BUCKETS)
+        self._queue_wait = metrics.histogram(
+            'cyberpunk_db_write_queue_wait_seconds', 'Time writes wait in the queue before their transaction starts')
+        self._commit_duration = metrics.histogram(
+            'cyberpunk_db_write_commit_seconds', 'Time spent applying and committing one group')
+
+        self._thread = threading.Thread(target=self._run, name='cyberpunk-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, statements: Sequence[Statement]) -> Future:
+        """
+        Queue a request's writes
+
+        Args:
+            statements: (query, params) pairs applied in order, all or nothing
+
+        Returns:
+            Future resolving to a list with one result per statement
+            (last row ID for INSERT, affected rows otherwise)
+        """
+        future: Future = Future()
+        self._queue.put((list(statements), future, time.perf_counter()))
+        return future
+
+    def execute(self, statements: Sequence[Statement]) -> List[int]:
+        """Queue a request's writes and wait until they are committed"""
+        return self.submit(statements).result()
+
+    def run(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        """
+        Run a function on the writer's connection and wait until its writes are committed
+
+        Args:
+            work: Called with the connection inside the group's transaction;
+                raising rolls back its writes
+
+        Returns:
+            What `work` returned
+        """
+        future: Future = Future()
+        self._queue.put((work, future, time.perf_counter()))
+        return future.result()
+
+    def close(self):
+        """Commit what is queued and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    # ==================== Writer Thread ====================
+
+    def _collect(self, first) -> Tuple[list, bool]:
+        """Gather requests arriving within the window after the first one"""
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _apply(self, conn, batch):
+        """Apply one group in a single transaction"""
+        start = time.perf_counter()
+        for _, _, queued_at in batch:
+            self._queue_wait.observe(start - queued_at)
+
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for index, (request, future, _) in enumerate(batch):
+                savepoint = f"request_{index}"
+                conn.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    if callable(request):
+                        results = request(conn)
+                    else:
+                        results = []
+                        for query, params in request:
+                            cursor = conn.execute(query, params)
+                            results.append(statement_result(cursor, query))
+                    conn.execute(f"RELEASE {savepoint}")
+                    outcomes.append((future, results, None))
+                except Exception as e:
+                    # Not only sqlite3.Error: binding a bad parameter raises OverflowError etc.
+                    conn.execute(f"ROLLBACK TO {savepoint}")
+                    conn.execute(f"RELEASE {savepoint}")
+                    self.helper.record_error('write_queue', e)
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # BEGIN or COMMIT failed: nothing in this group was written
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._batch_size.observe(len(batch))
+        self._commit_duration.observe(time.perf_counter() - start)
+        # Results are only handed out once the transaction is durable
+        for future, results, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results)
+
+    def _run(self):
+        conn = None
+        try:
+            stopping = False
+            while not stopping:
+                first = self._queue.get()
+                if first is None:
+                    break
+                batch, stopping = self._collect(first)
+                try:
+                    if conn is None:
+                        conn = self.helper.connect_writer()
+                    self._apply(conn, batch)
+                except Exception as e:
+                    # Never let the writer thread die: callers would wait forever
+                    for _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def benchmark(db_path: str, threads: int = 16, writes_per_thread: int = 200,
+              window: float = 0.002) -> dict:
+    """
+    Compare direct commits with the write queue under concurrent writers
+
+    Every thread updates a character's HP repeatedly, first with one commit
+    per statement (today's execute_update path), then through the queue.
+
+    Args:
+        db_path: Database to test against (should contain characters)
+        threads: Number of concurrent writer threads
+        writes_per_thread: Updates per thread
+        window: Group-commit window in seconds
+
+    Returns:
+        Dictionary with throughput, p50/p99 latency and error count per mode
+    """
+    from db_helper import DatabaseHelper
+    from metrics import MetricsRegistry
+
+    query = "UPDATE characters SET hp = hp WHERE character_id = ?"
+
+    def run(helper) -> dict:
+        character_ids = [r['character_id'] for r in helper.execute_query(
+            "SELECT character_id FROM characters")] or [1]
+        latencies: List[float] = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def worker(n):
+            for i in range(writes_per_thread):
+                start = time.perf_counter()
+                try:
+                    helper.execute_update(query, (character_ids[(n + i) % len(character_ids)],))
+                except sqlite3.OperationalError:
+                    with lock:
+                        errors[0] += 1
+                    continue
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        total = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            'writes_per_sec': len(latencies) / total,
+            'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+            'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+            'errors': errors[0],
+        }
+
+    direct = DatabaseHelper(db_path, metrics=MetricsRegistry(), slow_query_threshold=None)
+    queued = DatabaseHelper(db_path, metrics=MetricsRegistry(), slow_query_threshold=None,
+                            write_queue_window=window)
+    try:
+        return {'direct': run(direct), 'write_queue': run(queued)}
+    finally:
+        queued.write_queue.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'cyberpunk_tracker.db'
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    print("Cyberpunk Tracker - Write Queue Benchmark")
+    print("=" * 50)
+    print(f"{threads} threads writing to {db_path}\n")
+    for mode, stats in benchmark(db_path, threads=threads).items():
+        print(f"{mode:12} {stats['writes_per_sec']:8.0f} writes/s   "
+              f"p50 {stats['p50_ms']:6.2f} ms   p99 {stats['p99_ms']:7.2f} ms   "
+              f"errors {stats['errors']}")
@@ -2,12 +2,28 @@ document.addEventListener("DOMContentLoaded", () => {
     const buttons = document.querySelectorAll(".menu-button");
     const content = document.getElementById("content");
 
+    // Page fragments are static, so fetch each one only once per session
+    const pageCache = new Map();
+
+    function fetchPage(page) {
+        if (!pageCache.has(page)) {
+            const request = fetch(page)
+                .then(res => {
+                    if (!res.ok) throw new Error("Fetch failed");
+                    return res.text();
+                })
+                .catch(err => {
+                    // Don't cache failures, so the next click retries
+                    pageCache.delete(page);
+                    throw err;
+                });
+            pageCache.set(page, request);
+        }
+        return pageCache.get(page);
+    }
+
     function loadPage(page) {
-        fetch(page)
-            .then(res => {
-                if (!res.ok) throw new Error("Fetch failed");
-                return res.text();
-            })
+        fetchPage(page)
             .then(html => {
                 content.innerHTML = html;
                 